@@ -1,5 +1,6 @@
 import sys, os, random, pygame
-sys.path.append(os.path.join("objects"))
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(here, "objects"))
 import SudokuSquare
 from GameResources import *
 
@@ -7,52 +8,101 @@ digits = '123456789'
 rows = 'ABCDEFGHI'
 
 
-def play(values_list):
+def square_position(x, y):
+    """Return the top left corner of the square in column x and row y on the board image."""
+    if x in (0, 1, 2):  startX = (x * 57) + 38
+    if x in (3, 4, 5):  startX = (x * 57) + 99
+    if x in (6, 7, 8):  startX = (x * 57) + 159
+
+    if y in (0, 1, 2):  startY = (y * 57) + 35
+    if y in (3, 4, 5):  startY = (y * 57) + 100
+    if y in (6, 7, 8):  startY = (y * 57) + 165
+    return startX, startY
+
+
+def box_number(values, box):
+    """Return the digit of a solved box as an int, or None."""
+    string_number = values[box]
+    if len(string_number) > 1 or string_number == '' or string_number == '.':
+        return None
+    return int(string_number)
+
+
+def play(values_list, headless=False, frame_dir=None, fps=5, frame_format='png'):
+    """
+    Replay boards in dictionary form.
+    The squares are built once; every frame only redraws the squares whose number changed.
+    With headless, the SDL dummy video driver is used, frames are not paced and play() returns after the
+    last frame instead of waiting for the window to be closed. With frame_dir, every frame is saved
+    there as frame00000.png, frame00001.png, ... in frame_format ('png', 'jpg', 'bmp' or 'tga'; png is
+    lossless but much slower to write than jpg or bmp).
+    Returns the number of frames drawn.
+    """
+    if not headless:
+        return _play(values_list, False, frame_dir, fps, frame_format)
+
+    # only this call is headless; later windows use the driver the process had before
+    previous_driver = os.environ.get('SDL_VIDEODRIVER')
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    try:
+        return _play(values_list, True, frame_dir, fps, frame_format)
+    finally:
+        pygame.quit()
+        if previous_driver is None:
+            del os.environ['SDL_VIDEODRIVER']
+        else:
+            os.environ['SDL_VIDEODRIVER'] = previous_driver
+
+
+def _play(values_list, headless, frame_dir, fps, frame_format):
     pygame.init()
+    SudokuSquare.clear_fonts()
 
 
     size = width, height = 700, 700
     screen = pygame.display.set_mode(size)
 
-    background_image = pygame.image.load("./images/sudoku-board-bare.jpg").convert()
+    background_image = pygame.image.load(os.path.join(here, "images", "sudoku-board-bare.jpg")).convert()
 
     clock = pygame.time.Clock()
 
-    # The puzzleNumber sets a seed so either generate
-    # a random number to fill in here or accept user
-    # input for a duplicatable puzzle.
+    if frame_dir is not None and not os.path.isdir(frame_dir):
+        os.makedirs(frame_dir)
+
+    theSquares = {}
+    for y in range(9):
+        for x in range(9):
+            startX, startY = square_position(x, y)
+            theSquares[rows[y] + digits[x]] = SudokuSquare.SudokuSquare(None, startX, startY, "N", x, y)
 
+    frames = 0
     for values in values_list:
         pygame.event.pump()
-        theSquares = []
-        initXLoc = 0
-        initYLoc = 0
-        startX, startY, editable, number = 0, 0, "N", 0
-        for y in range(9):
-            for x in range(9):
-                if x in (0, 1, 2):  startX = (x * 57) + 38
-                if x in (3, 4, 5):  startX = (x * 57) + 99
-                if x in (6, 7, 8):  startX = (x * 57) + 159
-
-                if y in (0, 1, 2):  startY = (y * 57) + 35
-                if y in (3, 4, 5):  startY = (y * 57) + 100
-                if y in (6, 7, 8):  startY = (y * 57) + 165
-                col = digits[x]
-                row = rows[y]
-                string_number = values[row + col]
-                if len(string_number) > 1 or string_number == '' or string_number == '.':
-                    number = None
-                else:
-                    number = int(string_number)
-                theSquares.append(SudokuSquare.SudokuSquare(number, startX, startY, editable, x, y))
-
-        screen.blit(background_image, (0, 0))
-        for num in theSquares:
-            num.draw()
-
-        pygame.display.flip()
-        pygame.display.update()
-        clock.tick(5)
+        if frames == 0:
+            screen.blit(background_image, (0, 0))
+            for box, square in theSquares.items():
+                square.setNumber(box_number(values, box))
+                square.draw(screen)
+            pygame.display.flip()
+        else:
+            dirty = []
+            for box, square in theSquares.items():
+                area = square.area()
+                if square.setNumber(box_number(values, box)):
+                    area = area.union(square.area())
+                    screen.blit(background_image, area, area)
+                    square.draw(screen)
+                    dirty.append(area)
+            pygame.display.update(dirty)
+
+        if frame_dir is not None:
+            pygame.image.save(screen, os.path.join(frame_dir, 'frame%05d.%s' % (frames, frame_format)))
+        frames += 1
+        if not headless:
+            clock.tick(fps)
+
+    if headless:
+        return frames
 
     # leave game showing until closed by user
     while True:
@@ -0,0 +1,100 @@
+"""
+Batch solving of many grid strings on a process pool.
+
+Grids are sent to the workers in chunks, and only a bounded number of chunks is in flight at any time,
+so arbitrarily long iterables can be streamed through solve_many() without reading them into memory.
+"""
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+import os
+
+import bitmask
+import solution
+
+# One result per grid. values is the solved sudoku in dictionary form, or False if it has no solution.
+# error holds a message when the grid could not be solved at all (for example a malformed grid string),
+# in which case values is None.
+BatchResult = namedtuple('BatchResult', ['index', 'grid', 'values', 'error'])
+
+
+def _init_worker(topology):
+    """Build the topology and its bitmask tables once per worker process, before the first chunk arrives."""
+    bitmask.get_tables(topology)
+
+
+def _solve_chunk(start, grids, engine, topology):
+    """
+    Solve a chunk of grids, reporting failures per grid.
+    Input: The index of the first grid, the grid strings, the engine name and the Topology of the grids.
+    Output: A list of BatchResult.
+    """
+    results = []
+    for offset, grid in enumerate(grids):
+        try:
+            values = solution.solve(grid, engine, topology=topology)
+            results.append(BatchResult(start + offset, grid, values, None))
+        except Exception as e:
+            results.append(BatchResult(start + offset, grid, None, '%s: %s' % (type(e).__name__, e)))
+    return results
+
+
+def _chunks(grids, chunksize):
+    """Yield (start index, list of grids) pairs of at most chunksize grids."""
+    grids = iter(grids)
+    start = 0
+    while True:
+        chunk = list(islice(grids, chunksize))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def solve_many(grids, workers=None, chunksize=64, engine='dict', ordered=True, topology=None):
+    """
+    Solve many sudoku grids on a pool of worker processes.
+    Args:
+        grids(iterable): grid strings in the format accepted by utils.grid_values().
+        workers(int): number of worker processes, os.cpu_count() if None. With 0 or 1 the grids are
+            solved in the calling process.
+        chunksize(int): number of grids sent to a worker at a time.
+        engine(string): the search engine to use, one of the keys of solution.ENGINES.
+        ordered(bool): yield results in input order if True, or as soon as their chunk finishes if False.
+        topology(Topology): the board of the grids, from utils.get_topology(). The default 9x9 diagonal
+            board if None. Workers look it up in their own topology cache, so it is built once per worker.
+    Returns:
+        A generator of BatchResult, one per grid.
+    """
+    solution.get_engine(engine)
+    if chunksize < 1:
+        raise ValueError('chunksize must be at least 1')
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+        for start, chunk in _chunks(grids, chunksize):
+            for result in _solve_chunk(start, chunk, engine, topology):
+                yield result
+        return
+
+    max_pending = workers * 2
+    chunks = _chunks(grids, chunksize)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(topology,)) as pool:
+        pending = deque()
+        for start, chunk in islice(chunks, max_pending):
+            pending.append(pool.submit(_solve_chunk, start, chunk, engine, topology))
+
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done = [future for future in pending if future in finished]
+                for future in done:
+                    pending.remove(future)
+            for future in done:
+                for result in future.result():
+                    yield result
+                for start, chunk in islice(chunks, 1):
+                    pending.append(pool.submit(_solve_chunk, start, chunk, engine, topology))
@@ -0,0 +1,246 @@
+"""
+Benchmark harness for the solver.
+
+Runs solution.solve() and solution.reduce_puzzle() over the corpora in puzzles/ and reports puzzles per
+second, p50/p99 latency, search nodes and peak memory per corpus. Results can be saved as JSON and
+compared against a saved baseline; the run fails if any metric regressed by more than the tolerance.
+
+Example:
+    python benchmark.py --output baseline.json
+    python benchmark.py --engine queue --baseline baseline.json --tolerance 0.15
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import bitmask
+import branching
+import dlx
+import solution
+from utils import get_topology, grid_values
+
+corpus_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'puzzles')
+
+# corpus name -> (file in puzzles/, board side, diagonal units)
+CORPORA = {
+    'easy': ('easy.txt', 9, False),
+    'hard': ('hard.txt', 9, False),
+    'diagonal': ('diagonal.txt', 9, True),
+    'unsolvable': ('unsolvable.txt', 9, True),
+}
+
+MODES = ('solve', 'reduce')
+
+# metric -> True if higher is better; compare() flags moves in the other direction
+METRICS = {
+    'puzzles_per_sec': True,
+    'p50_ms': False,
+    'p99_ms': False,
+    'nodes': False,
+    'peak_kib': False,
+}
+
+
+def load_corpus(name):
+    """
+    Read a bundled corpus.
+    Input: The name of the corpus, one of the keys of CORPORA.
+    Output: A tuple (list of grid strings, Topology of the grids).
+    """
+    filename, n, diagonal = CORPORA[name]
+    with open(os.path.join(corpus_dir, filename)) as f:
+        grids = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return grids, get_topology(n, diagonal)
+
+
+def percentile(sorted_values, fraction):
+    """Return the value at the given fraction (0..1) of a sorted list, by nearest rank."""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, int(math.ceil(fraction * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def count_nodes(grids, topology, engine, policy=None):
+    """
+    Count the search nodes the engine visits over a corpus.
+    The dict engine counts its own nodes through its branching policy (the default one if None), and
+    the dlx engine counts its own too. The bitmask and trail engines branch like the sweep TrailSearch
+    and the queue engine like the queue TrailSearch, so their trees are measured with those.
+    """
+    if engine == 'dict':
+        nodes = 0
+        for grid in grids:
+            counter = branching.get_policy(policy)
+            solution.solve(grid, engine, topology=topology, branching=counter)
+            nodes += counter.nodes
+        return nodes
+    if engine == 'dlx':
+        nodes = 0
+        for grid in grids:
+            matrix = dlx.build(grid_values(grid, topology), topology)
+            matrix.solve(1)
+            nodes += matrix.nodes
+        return nodes
+    tables = bitmask.get_tables(topology)
+    propagation = 'queue' if engine == 'queue' else 'sweep'
+    nodes = 0
+    for grid in grids:
+        searcher = bitmask.TrailSearch(bitmask.from_values(grid_values(grid, topology), tables), propagation, tables)
+        searcher.search()
+        nodes += searcher.nodes
+    return nodes
+
+
+def _runner(mode, engine, topology, policy=None):
+    """Return a function solving one grid in the given mode."""
+    if mode == 'solve' and engine == 'dict':
+        return lambda grid: solution.solve(grid, engine, topology=topology, branching=policy)
+    if mode == 'solve':
+        return lambda grid: solution.solve(grid, engine, topology=topology)
+    return lambda grid: solution.reduce_puzzle(grid_values(grid, topology), topology=topology)
+
+
+def run_corpus(grids, topology, mode='solve', engine='dict', repeat=1, policy=None):
+    """
+    Benchmark one corpus.
+    Input: The grid strings, their Topology, the mode ('solve' or 'reduce'), the engine used in solve mode,
+           the number of passes over the corpus and the name of the dict engine's branching policy.
+    Output: A dictionary of metrics.
+    """
+    run = _runner(mode, engine, topology, policy)
+
+    # memory is measured on a separate, untimed pass that also warms up the caches;
+    # tracemalloc slows down every allocation
+    tracemalloc.start()
+    try:
+        for grid in grids:
+            run(grid)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for grid in grids:
+            start = time.perf_counter()
+            run(grid)
+            latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'count': len(grids),
+        'puzzles_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'nodes': count_nodes(grids, topology, engine, policy) if mode == 'solve' else 0,
+        'peak_kib': peak / 1024.0,
+    }
+
+
+def run_benchmark(corpora=None, modes=MODES, engine='dict', repeat=1, policy=None):
+    """
+    Benchmark the solver over bundled corpora.
+    Input: The corpus names (all of CORPORA if None), the modes, the engine, the number of passes and
+           the name of the dict engine's branching policy (the default policy if None).
+    Output: A JSON-serializable dictionary with a 'meta' section and one 'results' entry per corpus/mode.
+    """
+    solution.get_engine(engine)
+    if policy is not None:
+        branching.get_policy(policy)
+        if engine != 'dict':
+            raise ValueError('Branching policies are only supported by the dict engine')
+    results = {}
+    for name in corpora or sorted(CORPORA):
+        grids, topology = load_corpus(name)
+        for mode in modes:
+            results['%s/%s' % (name, mode)] = run_corpus(grids, topology, mode, engine, repeat, policy)
+    return {
+        'meta': {
+            'engine': engine,
+            'branching': policy or branching.Branching.name,
+            'repeat': repeat,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance=0.10):
+    """
+    Compare a benchmark run against a baseline.
+    Input: Two dictionaries returned by run_benchmark() and the allowed relative change.
+    Output: A list of messages, one per metric that regressed by more than the tolerance.
+    """
+    regressions = []
+    for key, metrics in sorted(current['results'].items()):
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        for metric, higher_is_better in sorted(METRICS.items()):
+            old = base.get(metric)
+            new = metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / float(old)
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append('%s %s: %.4g -> %.4g (%+.1f%%)' % (key, metric, old, new, change * 100))
+    return regressions
+
+
+def format_results(report):
+    """Return the results of a benchmark run as a text table."""
+    lines = ['%-22s %6s %12s %10s %10s %8s %10s' % ('corpus/mode', 'count', 'puzzles/s', 'p50 ms', 'p99 ms',
+                                                    'nodes', 'peak KiB')]
+    for key, m in sorted(report['results'].items()):
+        lines.append('%-22s %6d %12.1f %10.3f %10.3f %8d %10.1f' % (
+            key, m['count'], m['puzzles_per_sec'], m['p50_ms'], m['p99_ms'], m['nodes'], m['peak_kib']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the sudoku solver on the bundled corpora.')
+    parser.add_argument('--corpus', nargs='+', choices=sorted(CORPORA), help='corpora to run (default: all)')
+    parser.add_argument('--mode', nargs='+', choices=MODES, default=list(MODES), help='modes to run (default: all)')
+    parser.add_argument('--engine', default='dict', choices=sorted(solution.ENGINES),
+                        help='search engine for solve mode (default: dict)')
+    parser.add_argument('--branching', choices=sorted(branching.POLICIES),
+                        help='branching policy of the dict engine (default: first)')
+    parser.add_argument('--repeat', type=int, default=3, help='passes over every corpus (default: 3)')
+    parser.add_argument('-o', '--output', help='save the results as JSON')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='allowed relative regression against the baseline (default: 0.10)')
+    args = parser.parse_args(argv)
+    if args.branching is not None and args.engine != 'dict':
+        parser.error('--branching is only supported by the dict engine')
+
+    report = run_benchmark(args.corpus, args.mode, args.engine, args.repeat, args.branching)
+    print(format_results(report))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print('\nRegressions against %s:' % args.baseline)
+            for message in regressions:
+                print('  ' + message)
+            return 1
+        print('\nNo regressions against %s.' % args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,470 @@
+"""
+Bitmask candidate engine.
+
+The candidates of every box are stored as an integer with one bit per digit (bit 0 is digit '1', bit 8 is
+digit '9' on a 9x9 board) in a flat list indexed in the order of the topology's boxes. Units and peers are
+precomputed as integer index tables, so no strings are built or compared while the puzzle is being reduced.
+The tables are built once per utils.Topology by get_tables(); every function uses the tables of the default
+9x9 diagonal board unless it is given others.
+
+Every strategy here mirrors the corresponding function of the dict engine in solution.py step by step,
+so both engines reach the same boards and the same solutions.
+
+The strategies take an optional trail (undo log). When one is given, every change is recorded on it as
+an (index, old mask) pair before the mask is overwritten, so TrailSearch can work on a single board and
+roll it back when it backtracks instead of copying it for every branch.
+
+propagate() applies the same strategies from a work queue instead of sweeping the whole board: only the
+peers and units of boxes that actually changed are revisited, so its cost grows with the number of changes.
+"""
+from collections import deque
+
+from utils import check_deadline, default_topology
+
+
+class _Memo(dict):
+    """Dictionary that computes and stores missing entries with a function of the key."""
+
+    def __init__(self, function):
+        dict.__init__(self)
+        self.function = function
+
+    def __missing__(self, key):
+        value = self[key] = self.function(key)
+        return value
+
+
+class Tables(object):
+    """Index and lookup tables of the bitmask engine for one utils.Topology."""
+
+    def __init__(self, topology):
+        self.topology = topology
+        self.digits = digits = topology.digits
+        self.full_mask = full_mask = (1 << len(digits)) - 1
+
+        # bit of every digit, in the same order the dict engine iterates over the digits
+        self.digit_bits = digit_bits = [1 << i for i in range(len(digits))]
+        self.digit_bit = dict(zip(digits, digit_bits))
+
+        # number of candidates and dict form of a mask: full lookup tables for small boards, memoized otherwise
+        if len(digits) <= 16:
+            self.bit_count = [bin(m).count('1') for m in range(full_mask + 1)]
+        else:
+            self.bit_count = _Memo(lambda m: bin(m).count('1'))
+        self.mask_string = _Memo(lambda m: ''.join(d for d, bit in zip(digits, digit_bits) if m & bit))
+        if len(digits) <= 9:
+            self.mask_string = [self.mask_string[m] for m in range(full_mask + 1)]
+        self.string_mask = _Memo(lambda s: sum(set(self.digit_bit[d] for d in s)))
+
+        self.boxes = boxes = topology.boxes
+        self.box_index = box_index = dict((box, i) for i, box in enumerate(boxes))
+        self.unit_indices = [[box_index[box] for box in unit] for unit in topology.unitlist]
+        self.peer_indices = [[box_index[peer] for peer in sorted(topology.peers[box])] for box in boxes]
+        self.box_units = [[u for u, unit in enumerate(self.unit_indices) if i in unit] for i in range(len(boxes))]
+
+
+_tables = {}
+
+
+def get_tables(topology=None):
+    """
+    Return the Tables of a topology, building them on the first request only.
+    Input: A utils.Topology, the default 9x9 board if None.
+    Output: The cached Tables.
+    """
+    if topology is None or topology is default_topology:
+        return default_tables
+    tables = _tables.get(topology)
+    if tables is None:
+        tables = _tables[topology] = Tables(topology)
+    return tables
+
+
+default_tables = Tables(default_topology)
+
+# tables of the default board, for modules that only work on 9x9 boards
+digits = default_tables.digits
+full_mask = default_tables.full_mask
+digit_bits = default_tables.digit_bits
+bit_count = default_tables.bit_count
+mask_string = default_tables.mask_string
+string_mask = default_tables.string_mask
+box_index = default_tables.box_index
+unit_indices = default_tables.unit_indices
+peer_indices = default_tables.peer_indices
+box_units = default_tables.box_units
+
+
+def from_values(values, tables=None):
+    """
+    Convert a sudoku in dictionary form into a list of candidate masks.
+    Input: A sudoku in dictionary form, and the Tables of its topology (the default tables if None).
+    Output: A list of masks in the order of the topology's boxes.
+    """
+    t = tables or default_tables
+    string_mask = t.string_mask
+    return [string_mask[values[box]] for box in t.boxes]
+
+
+def to_values(cands, tables=None):
+    """
+    Convert a list of candidate masks back into a sudoku in dictionary form.
+    Input: A list of masks in the order of the topology's boxes, and the Tables of its topology.
+    Output: A sudoku in dictionary form.
+    """
+    t = tables or default_tables
+    mask_string = t.mask_string
+    return dict(zip(t.boxes, [mask_string[m] for m in cands]))
+
+
+def eliminate(cands, trail=None, tables=None):
+    """
+    Remove the value of every solved box from the candidates of its peers.
+    Input: A list of candidate masks, an optional trail to record changes on and the Tables of the board.
+    Output: The same list, reduced.
+    """
+    t = tables or default_tables
+    bit_count = t.bit_count
+    peer_indices = t.peer_indices
+    solved = [i for i, m in enumerate(cands) if bit_count[m] == 1]
+    for i in solved:
+        keep = ~cands[i]
+        for p in peer_indices[i]:
+            old = cands[p]
+            if old & ~keep:
+                if trail is not None:
+                    trail.append((p, old))
+                cands[p] = old & keep
+    return cands
+
+
+def only_choice(cands, trail=None, tables=None):
+    """
+    Assign every digit that only fits in one box of a unit to that box.
+    Input: A list of candidate masks, an optional trail to record changes on and the Tables of the board.
+    Output: The same list, reduced.
+    """
+    t = tables or default_tables
+    digit_bits = t.digit_bits
+    for unit in t.unit_indices:
+        # digits seen exactly once in the unit; units without any are skipped without a per-digit scan
+        once = twice = 0
+        for i in unit:
+            m = cands[i]
+            twice |= once & m
+            once |= m
+        if not once & ~twice:
+            continue
+        for bit in digit_bits:
+            places = [i for i in unit if cands[i] & bit]
+            if len(places) == 1 and cands[places[0]] != bit:
+                if trail is not None:
+                    trail.append((places[0], cands[places[0]]))
+                cands[places[0]] = bit
+    return cands
+
+
+def naked_twins(cands, trail=None, tables=None):
+    """
+    Eliminate the digits of every naked twin from the other boxes of its unit.
+    Input: A list of candidate masks, an optional trail to record changes on and the Tables of the board.
+    Output: The same list, reduced.
+    """
+    t = tables or default_tables
+    bit_count = t.bit_count
+    for unit in t.unit_indices:
+        seen = set()
+        twins = set()
+        for i in unit:
+            m = cands[i]
+            if bit_count[m] == 2:
+                if m in seen:
+                    twins.add(m)
+                seen.add(m)
+        for twin in sorted(twins):
+            keep = ~twin
+            for i in unit:
+                old = cands[i]
+                if old != twin and old & twin:
+                    if trail is not None:
+                        trail.append((i, old))
+                    cands[i] = old & keep
+    return cands
+
+
+def reduce_puzzle(cands, trail=None, tables=None, deadline=None):
+    """
+    Iterate eliminate(), naked_twins() and only_choice() until the number of solved boxes stops changing.
+    Input: A list of candidate masks, an optional trail to record changes on, the Tables of the board
+           and an optional time.monotonic() deadline.
+    Output: The reduced list, or False if some box has no candidates left.
+    """
+    t = tables or default_tables
+    bit_count = t.bit_count
+    stalled = False
+    while not stalled:
+        check_deadline(deadline)
+        solved_before = sum(1 for m in cands if bit_count[m] == 1)
+        eliminate(cands, trail, t)
+        naked_twins(cands, trail, t)
+        only_choice(cands, trail, t)
+        solved_after = sum(1 for m in cands if bit_count[m] == 1)
+        stalled = solved_before == solved_after
+        if 0 in cands:
+            return False
+    return cands
+
+
+def propagate(cands, changed=None, trail=None, tables=None):
+    """
+    Reduce the puzzle with eliminate, only choice and naked twins driven by a work queue.
+
+    A box whose candidates change is queued once; when it is processed its value is removed from its
+    peers (if it is solved) and every unit containing it is queued for the only choice and naked twins
+    checks. Processing stops at the first empty box or unit that cannot place a digit.
+    Input: A list of candidate masks, the indices of the boxes that changed since the board was last
+           propagated (all boxes if None), an optional trail to record changes on and the Tables of the board.
+    Output: The reduced list, or False if the puzzle has become unsolvable.
+    """
+    t = tables or default_tables
+    bit_count = t.bit_count
+    full_mask = t.full_mask
+    unit_indices = t.unit_indices
+    peer_indices = t.peer_indices
+    box_units = t.box_units
+    if changed is None:
+        changed = range(len(cands))
+    box_queue = deque(changed)
+    box_queued = [False] * len(cands)
+    for i in box_queue:
+        box_queued[i] = True
+    unit_queue = deque()
+    unit_queued = [False] * len(unit_indices)
+
+    while box_queue or unit_queue:
+        if box_queue:
+            i = box_queue.popleft()
+            box_queued[i] = False
+            m = cands[i]
+            if not m:
+                return False
+            if bit_count[m] == 1:
+                keep = ~m
+                for p in peer_indices[i]:
+                    old = cands[p]
+                    if old & m:
+                        if trail is not None:
+                            trail.append((p, old))
+                        cands[p] = old & keep
+                        if not box_queued[p]:
+                            box_queued[p] = True
+                            box_queue.append(p)
+            for u in box_units[i]:
+                if not unit_queued[u]:
+                    unit_queued[u] = True
+                    unit_queue.append(u)
+            continue
+
+        u = unit_queue.popleft()
+        unit_queued[u] = False
+        unit = unit_indices[u]
+
+        # only choice: digits that fit in exactly one box of the unit
+        once = twice = 0
+        for i in unit:
+            m = cands[i]
+            twice |= once & m
+            once |= m
+        if once != full_mask:
+            return False
+        singles = once & ~twice
+        if singles:
+            for i in unit:
+                m = cands[i]
+                hidden = m & singles
+                if hidden and m != hidden:
+                    if bit_count[hidden] > 1:
+                        return False
+                    if trail is not None:
+                        trail.append((i, m))
+                    cands[i] = hidden
+                    if not box_queued[i]:
+                        box_queued[i] = True
+                        box_queue.append(i)
+
+        # naked twins: two boxes of the unit sharing the same two candidates
+        seen = {}
+        for i in unit:
+            m = cands[i]
+            if bit_count[m] == 2:
+                seen[m] = seen.get(m, 0) + 1
+        for twin, count in seen.items():
+            if count < 2:
+                continue
+            if count > 2:
+                return False
+            keep = ~twin
+            for i in unit:
+                old = cands[i]
+                if old != twin and old & twin:
+                    if trail is not None:
+                        trail.append((i, old))
+                    cands[i] = old & keep
+                    if not box_queued[i]:
+                        box_queued[i] = True
+                        box_queue.append(i)
+    return cands
+
+
+def search(cands, tables=None, deadline=None):
+    """
+    Depth-first search over the candidate masks, branching on the first box with the fewest candidates.
+    Input: A list of candidate masks, the Tables of the board and an optional time.monotonic() deadline.
+    Output: The solved list, or False if the puzzle has no solution.
+    """
+    t = tables or default_tables
+    bit_count = t.bit_count
+    cands = reduce_puzzle(cands, None, t, deadline)
+    if cands is False:
+        return False
+
+    min_box = -1
+    min_len = len(t.digits) + 1
+    for i, m in enumerate(cands):
+        n = bit_count[m]
+        if 1 < n < min_len:
+            min_len = n
+            min_box = i
+    if min_box == -1:
+        return cands
+
+    choices = cands[min_box]
+    for bit in t.digit_bits:
+        if choices & bit:
+            new_cands = cands[:]
+            new_cands[min_box] = bit
+            attempt = search(new_cands, t, deadline)
+            if attempt:
+                return attempt
+    return False
+
+
+class TrailSearch(object):
+    """
+    Depth-first search that works on a single board in place.
+
+    Every change made while reducing or branching is recorded on the trail, and backtracking pops the
+    trail back to the mark taken before the branch. Branching order is the same as search().
+
+    With propagation='sweep' every node is reduced with reduce_puzzle(), so the search finds the same
+    solution as search(). With propagation='queue' the root is reduced with propagate() and every other
+    node only propagates the box that was branched on.
+
+    Counters:
+        nodes: number of search nodes visited.
+        backtracks: number of branches that were rolled back.
+        peak_trail: largest number of changes held on the trail at once.
+    """
+
+    def __init__(self, cands, propagation='sweep', tables=None, deadline=None):
+        if propagation not in ('sweep', 'queue'):
+            raise ValueError('Unknown propagation %r, expected sweep or queue' % (propagation,))
+        self.cands = cands
+        self.tables = tables or default_tables
+        self.deadline = deadline
+        self.propagation = propagation
+        self.trail = []
+        self.nodes = 0
+        self.backtracks = 0
+        self.peak_trail = 0
+
+    def undo(self, mark):
+        """Restore every mask changed since the trail had length mark."""
+        cands = self.cands
+        trail = self.trail
+        while len(trail) > mark:
+            i, old = trail.pop()
+            cands[i] = old
+
+    def search(self, changed=None):
+        """
+        Solve the board in place.
+        Input: The indices of the boxes changed by the last branch (all boxes if None).
+        Output: True if the board is now solved, False if it has no solution.
+        """
+        self.nodes += 1
+        check_deadline(self.deadline)
+        cands = self.cands
+        trail = self.trail
+        t = self.tables
+        bit_count = t.bit_count
+        if self.propagation == 'queue':
+            reduced = propagate(cands, changed, trail, t)
+        else:
+            reduced = reduce_puzzle(cands, trail, t)
+        if len(trail) > self.peak_trail:
+            self.peak_trail = len(trail)
+        if reduced is False:
+            return False
+
+        min_box = -1
+        min_len = len(t.digits) + 1
+        for i, m in enumerate(cands):
+            n = bit_count[m]
+            if 1 < n < min_len:
+                min_len = n
+                min_box = i
+        if min_box == -1:
+            return True
+
+        choices = cands[min_box]
+        for bit in t.digit_bits:
+            if choices & bit:
+                mark = len(trail)
+                trail.append((min_box, choices))
+                cands[min_box] = bit
+                if self.search([min_box]):
+                    return True
+                self.undo(mark)
+                self.backtracks += 1
+        return False
+
+    def stats(self):
+        """Return the search counters as a dictionary."""
+        return {'nodes': self.nodes, 'backtracks': self.backtracks, 'peak_trail': self.peak_trail}
+
+
+def search_values(values, topology=None, deadline=None):
+    """
+    Solve a sudoku in dictionary form with the bitmask engine.
+    Input: A sudoku in dictionary form, its Topology (the default 9x9 board if None) and an optional deadline.
+    Output: The solved sudoku in dictionary form, or False if no solution exists.
+    """
+    tables = get_tables(topology)
+    cands = search(from_values(values, tables), tables, deadline)
+    if cands is False:
+        return False
+    return to_values(cands, tables)
+
+
+def search_values_trail(values, propagation='sweep', topology=None, deadline=None):
+    """
+    Solve a sudoku in dictionary form with the undo-trail search.
+    Input: A sudoku in dictionary form, the propagation mode of TrailSearch, the Topology of the sudoku
+           and an optional time.monotonic() deadline.
+    Output: The solved sudoku in dictionary form, or False if no solution exists.
+    """
+    tables = get_tables(topology)
+    searcher = TrailSearch(from_values(values, tables), propagation, tables, deadline)
+    if not searcher.search():
+        return False
+    return to_values(searcher.cands, tables)
+
+
+def search_values_queue(values, topology=None, deadline=None):
+    """
+    Solve a sudoku in dictionary form with the undo-trail search and queue-driven propagation.
+    Input: A sudoku in dictionary form, its Topology (the default 9x9 board if None) and an optional deadline.
+    Output: The solved sudoku in dictionary form, or False if no solution exists.
+    """
+    return search_values_trail(values, 'queue', topology, deadline)
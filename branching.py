@@ -0,0 +1,123 @@
+"""
+Branching policies for the dict engine's search().
+
+A policy picks the box search() branches on and the order the digits of that box are tried in, and it
+is told about every failed branch so it can learn from failures. Every policy counts the search nodes
+it visited, so policies can be compared on the same puzzles.
+"""
+
+
+class Branching(object):
+    """
+    Branch on the first box with the fewest candidates and try its digits in string order.
+    This is the order search() has always used.
+
+    Counters:
+        nodes: number of search nodes visited.
+        failures: number of branches that failed.
+    """
+    name = 'first'
+
+    def __init__(self):
+        self.nodes = 0
+        self.failures = 0
+
+    def select(self, values, topology):
+        """Return the unsolved box to branch on."""
+        min_box = ''
+        min_len = topology.n + 1
+        for b in topology.boxes:
+            if (len(values[b]) < min_len) and (len(values[b]) > 1):
+                min_len = len(values[b])
+                min_box = b
+        return min_box
+
+    def order(self, values, box, topology):
+        """Return the digits of box in the order they are tried."""
+        return values[box]
+
+    def failed(self, values, box, topology):
+        """Called when assigning one of the digits of box failed."""
+        self.failures += 1
+
+    def stats(self):
+        """Return the counters as a dictionary."""
+        return {'policy': self.name, 'nodes': self.nodes, 'failures': self.failures}
+
+
+class MRVDegree(Branching):
+    """Minimum remaining values, ties broken by the number of unsolved peers (most constrained first)."""
+    name = 'mrv-degree'
+
+    def select(self, values, topology):
+        peers = topology.peers
+        best = None
+        best_key = None
+        for b in topology.boxes:
+            n = len(values[b])
+            if n > 1:
+                key = (n, -sum(1 for p in peers[b] if len(values[p]) > 1))
+                if best_key is None or key < best_key:
+                    best = b
+                    best_key = key
+        return best
+
+
+class DomWDeg(Branching):
+    """
+    dom/wdeg: branch on the box with the smallest ratio of candidates to the summed weight of its units.
+    Every unit starts with weight 1; when a branch fails, the units of the box it assigned gain 1.
+    The weights last as long as the instance, so reusing one instance carries them over to the next puzzle.
+    """
+    name = 'domwdeg'
+
+    def __init__(self):
+        Branching.__init__(self)
+        # unit weights keyed by id(), units are lists owned by their cached Topology
+        self.weights = {}
+
+    def select(self, values, topology):
+        weights = self.weights
+        best = None
+        best_score = None
+        for b in topology.boxes:
+            n = len(values[b])
+            if n > 1:
+                score = n / float(sum(weights.get(id(u), 1) for u in topology.units[b]))
+                if best_score is None or score < best_score:
+                    best = b
+                    best_score = score
+        return best
+
+    def failed(self, values, box, topology):
+        Branching.failed(self, values, box, topology)
+        for u in topology.units[box]:
+            self.weights[id(u)] = self.weights.get(id(u), 1) + 1
+
+
+class LeastConstrainingValue(Branching):
+    """First box with the fewest candidates; digits ordered by how few peer candidates they remove."""
+    name = 'lcv'
+
+    def order(self, values, box, topology):
+        peers = topology.peers[box]
+        return ''.join(sorted(values[box], key=lambda d: sum(1 for p in peers if d in values[p])))
+
+
+POLICIES = dict((policy.name, policy) for policy in (Branching, MRVDegree, DomWDeg, LeastConstrainingValue))
+
+
+def get_policy(policy=None):
+    """
+    Return a branching policy instance.
+    Input: None for the default policy, the name of a policy (one of the keys of POLICIES) or an instance.
+    Output: A Branching instance.
+    """
+    if policy is None:
+        return Branching()
+    if isinstance(policy, Branching):
+        return policy
+    try:
+        return POLICIES[policy]()
+    except KeyError:
+        raise ValueError('Unknown branching policy %r, expected one of %s' % (policy, ', '.join(sorted(POLICIES))))
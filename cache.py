@@ -0,0 +1,175 @@
+"""
+Solved-result cache keyed by the canonical form of a puzzle.
+
+Grids that only differ by a relabelling of the digits, or by a rotation, reflection or transposition of
+the board, combined with a reordering of its bands and stacks of sub-squares on boards up to 9x9, that
+maps the topology's units onto themselves (the diagonal units included), share one cache entry. The solution is stored in canonical form and mapped back to the caller's orientation and digits
+on every hit.
+"""
+from collections import OrderedDict
+from itertools import permutations
+import threading
+
+import solution
+from utils import default_topology, grid_string, grid_values
+
+_symmetries = {}
+
+
+def _dihedral(n):
+    """Yield the eight rotations and reflections of an n x n board as functions of (row, col)."""
+    m = n - 1
+    yield lambda r, c: (r, c)
+    yield lambda r, c: (c, r)
+    yield lambda r, c: (m - c, r)
+    yield lambda r, c: (m - r, m - c)
+    yield lambda r, c: (c, m - r)
+    yield lambda r, c: (r, m - c)
+    yield lambda r, c: (m - r, c)
+    yield lambda r, c: (m - c, m - r)
+
+
+def _band_swaps(n):
+    """
+    Yield the orderings of the bands and of the stacks of sub-squares of an n x n board, as maps of the
+    row and column indices. Only tried on boards of side 9 or less, where there are at most 36 of them.
+    """
+    side = int(round(n ** 0.5))
+    orders = list(permutations(range(side))) if n <= 9 else [tuple(range(side))]
+    for bands in orders:
+        rows = [bands[r // side] * side + r % side for r in range(n)]
+        for stacks in orders:
+            yield rows, [stacks[c // side] * side + c % side for c in range(n)]
+
+
+def symmetries(topology=None):
+    """
+    Return the board symmetries the units of a topology allow, built once per topology.
+    Input: A utils.Topology, the default 9x9 board if None.
+    Output: A list of permutations p of the box indices; a grid g is transformed into ''.join(g[i] for i in p).
+    """
+    topology = topology or default_topology
+    perms = _symmetries.get(topology)
+    if perms is None:
+        n = topology.n
+        index = dict((box, i) for i, box in enumerate(topology.boxes))
+        units = set(frozenset(index[box] for box in unit) for unit in topology.unitlist)
+        perms, seen = [], set()
+        for rows, cols in _band_swaps(n):
+            for transform in _dihedral(n):
+                perm = [r * n + c for r, c in (transform(rows[i // n], cols[i % n]) for i in range(n * n))]
+                if tuple(perm) not in seen and all(frozenset(perm[i] for i in unit) in units for unit in units):
+                    seen.add(tuple(perm))
+                    perms.append(perm)
+        _symmetries[topology] = perms
+    return perms
+
+
+def _relabel(grid, digits):
+    """Map the digits of grid to digits in order of first appearance; unused digits map in sorted order."""
+    mapping = {}
+    for c in grid:
+        if c != '.' and c not in mapping:
+            mapping[c] = digits[len(mapping)]
+    for d in digits:
+        if d not in mapping:
+            mapping[d] = digits[len(mapping)]
+    return mapping
+
+
+def canonical_form(grid, topology=None):
+    """
+    Find the canonical form of a grid under digit relabelling and the symmetries of its topology.
+    Input: A grid string in the format accepted by utils.grid_values(), and its Topology.
+    Output: A tuple (canonical grid string, permutation, digit mapping) such that
+            canonical == ''.join(mapping.get(c, c) for c in (grid[i] for i in permutation)).
+    """
+    topology = topology or default_topology
+    grid = grid_string(grid_values(grid, topology), topology)
+    best = None
+    for perm in symmetries(topology):
+        transformed = ''.join([grid[i] for i in perm])
+        mapping = _relabel(transformed, topology.digits)
+        candidate = ''.join([mapping.get(c, c) for c in transformed])
+        if best is None or candidate < best[0]:
+            best = (candidate, perm, mapping)
+    return best
+
+
+class SolveCache(object):
+    """
+    LRU cache of solutions in front of solution.solve().
+
+    Holds at most maxsize canonical puzzles. Puzzles without a solution are cached too.
+    Equivalent grids share an entry under the permutations of symmetries() only: for plain boards these are
+    the rotations and reflections and, up to 9x9, the reorderings of the bands and stacks (288 in all on
+    9x9). Swaps of rows within a band or columns within a stack are not tried, as they would make every
+    lookup try millions of permutations, so grids that differ by one of them get entries of their own.
+    Counters:
+        hits: number of solve() calls answered from the cache.
+        misses: number of solve() calls that ran the solver.
+    """
+
+    def __init__(self, maxsize=100000, engine='dict', topology=None):
+        solution.get_engine(engine)
+        self.maxsize = maxsize
+        self.engine = engine
+        self.topology = topology or default_topology
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def solve(self, grid):
+        """
+        Find the solution to a Sudoku grid, from the cache if an equivalent grid was solved before.
+        Args:
+            grid(string): a string representing a sudoku grid.
+        Returns:
+            The dictionary representation of the final sudoku grid. False if no solution exists.
+        """
+        topology = self.topology
+        canonical, perm, mapping = canonical_form(grid, topology)
+        with self._lock:
+            solved = self._entries.get(canonical)
+            if solved is not None:
+                self._entries.move_to_end(canonical)
+                self.hits += 1
+        if solved is None:
+            values = solution.solve(grid, self.engine, topology=topology)
+            if values is False:
+                solved = False
+            else:
+                values = grid_string(values, topology)
+                solved = ''.join([mapping[values[i]] for i in perm])
+            with self._lock:
+                self.misses += 1
+                self._entries[canonical] = solved
+                self._entries.move_to_end(canonical)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            if values is False:
+                return False
+            return grid_values(values, topology)
+        if solved is False:
+            return False
+
+        inverse = dict((v, k) for k, v in mapping.items())
+        values = [None] * len(perm)
+        for i, c in zip(perm, solved):
+            values[i] = inverse[c]
+        return grid_values(''.join(values), topology)
+
+    def stats(self):
+        """Return the cache counters as a dictionary."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries),
+                    'maxsize': self.maxsize, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        """Drop every cached solution and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
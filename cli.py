@@ -0,0 +1,122 @@
+"""
+Command-line solver for puzzle files.
+
+Reads one grid per line (in the format accepted by utils.grid_values()) from a file or stdin and writes
+one line per grid to stdout or a file: the solved grid, or a marker if the grid has no solution or could
+not be read. Files ending in .gz are read and written with gzip. Grids are streamed through
+batch.solve_many(), so memory stays constant however large the input is.
+
+Example:
+    python cli.py puzzles.txt.gz -o solutions.txt.gz --workers 8
+    zcat puzzles.txt.gz | python cli.py --engine queue > solutions.txt
+    python cli.py --size 16 --plain puzzles16.txt
+"""
+import argparse
+import gzip
+import io
+import os
+import sys
+import time
+
+import batch
+import solution
+from utils import get_topology, grid_string
+
+UNSOLVABLE = 'unsolvable'
+INVALID = 'invalid'
+
+
+def open_input(path, compressed=None):
+    """Open path ('-' for stdin) for reading text, with gzip if compressed or if path ends in .gz."""
+    if compressed is None:
+        compressed = path.endswith('.gz')
+    if path == '-':
+        raw = sys.stdin.buffer
+        return io.TextIOWrapper(gzip.GzipFile(fileobj=raw, mode='rb')) if compressed else sys.stdin
+    return gzip.open(path, 'rt') if compressed else open(path)
+
+
+def open_output(path, compressed=None):
+    """Open path ('-' for stdout) for writing text, with gzip if compressed or if path ends in .gz."""
+    if compressed is None:
+        compressed = path.endswith('.gz')
+    if path == '-':
+        raw = sys.stdout.buffer
+        return io.TextIOWrapper(gzip.GzipFile(fileobj=raw, mode='wb')) if compressed else sys.stdout
+    return gzip.open(path, 'wt') if compressed else open(path, 'w')
+
+
+def read_grids(lines):
+    """Yield the stripped, non-empty lines of an input file."""
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def format_result(result, topology=None):
+    """Return the output line for a BatchResult, without the newline."""
+    if result.error is not None:
+        return INVALID
+    if result.values is False:
+        return UNSOLVABLE
+    return grid_string(result.values, topology)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Solve sudoku grids, one per line.')
+    parser.add_argument('input', nargs='?', default='-', help='input file, - for stdin (default)')
+    parser.add_argument('-o', '--output', default='-', help='output file, - for stdout (default)')
+    parser.add_argument('--gzip-input', action='store_true', default=None,
+                        help='read gzip input even if the file name does not end in .gz')
+    parser.add_argument('--gzip-output', action='store_true', default=None,
+                        help='write gzip output even if the file name does not end in .gz')
+    parser.add_argument('--size', type=int, default=9, choices=(4, 9, 16, 25),
+                        help='side of the board (default: 9)')
+    parser.add_argument('--plain', action='store_true', help='the diagonals are not units (plain sudoku)')
+    parser.add_argument('--engine', default='dict', choices=sorted(solution.ENGINES),
+                        help='search engine (default: dict)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes, 0 for one per core (default: 1)')
+    parser.add_argument('--chunksize', type=int, default=256, help='grids per worker task (default: 256)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not report throughput on stderr')
+    args = parser.parse_args(argv)
+
+    topology = get_topology(args.size, not args.plain)
+    counts = {'solved': 0, UNSOLVABLE: 0, INVALID: 0}
+    start = time.time()
+    infile = open_input(args.input, args.gzip_input)
+    outfile = open_output(args.output, args.gzip_output)
+    try:
+        try:
+            results = batch.solve_many(read_grids(infile), workers=args.workers or None,
+                                       chunksize=args.chunksize, engine=args.engine, topology=topology)
+            for result in results:
+                line = format_result(result, topology)
+                counts[line if line in counts else 'solved'] += 1
+                outfile.write(line + '\n')
+        finally:
+            if infile is not sys.stdin:
+                infile.close()
+            if outfile is sys.stdout:
+                outfile.flush()
+            else:
+                outfile.close()
+    except BrokenPipeError:
+        # the reader went away (for example `| head`); point stdout at devnull so the
+        # interpreter's final flush does not fail again, and stop quietly
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+
+    if not args.quiet:
+        elapsed = time.time() - start
+        total = sum(counts.values())
+        sys.stderr.write('%d puzzles in %.2fs (%.1f puzzles/s): %d solved, %d unsolvable, %d invalid\n' % (
+            total, elapsed, total / elapsed if elapsed else 0.0, counts['solved'], counts[UNSOLVABLE],
+            counts[INVALID]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Exact-cover backend: Algorithm X with Dancing Links.
+
+A sudoku is an exact cover problem. Every box must hold exactly one digit (one column per box) and
+every unit of utils.unitlist must hold every digit exactly once (one column per unit and digit, so the
+diagonal units of diagonal sudoku become diagonal-digit columns). Every candidate digit of a box is a
+row covering its box column and the unit-digit columns of the units containing the box.
+
+The links are kept in flat integer lists instead of node objects, which keeps covering and uncovering
+cheap in pure Python.
+"""
+from utils import check_deadline, default_topology
+
+# number of search nodes between two calls of the stop function of DancingLinks.solve()
+STOP_INTERVAL = 1024
+
+
+class DancingLinks(object):
+    """
+    Sparse exact cover matrix with Knuth's dancing links.
+    Node 0 is the root, nodes 1..n_columns are the column headers and the rest are the row nodes.
+
+    Counters:
+        nodes: number of search nodes visited by the last solve().
+    """
+
+    def __init__(self, n_columns):
+        self.L = [n_columns] + list(range(n_columns))
+        self.R = list(range(1, n_columns + 1)) + [0]
+        self.U = list(range(n_columns + 1))
+        self.D = list(range(n_columns + 1))
+        self.C = list(range(n_columns + 1))
+        self.S = [0] * (n_columns + 1)
+        self.row = [None] * (n_columns + 1)
+        self.nodes = 0
+        self.deadline = None
+        self.stop = None
+
+    def add_row(self, columns, label):
+        """Add a row covering the given columns (numbered from 1), remembered by label."""
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        first = None
+        for col in columns:
+            x = len(C)
+            C.append(col)
+            U.append(U[col])
+            D.append(col)
+            D[U[col]] = x
+            U[col] = x
+            S[col] += 1
+            self.row.append(label)
+            if first is None:
+                first = x
+                L.append(x)
+                R.append(x)
+            else:
+                L.append(L[first])
+                R.append(first)
+                R[L[first]] = x
+                L[first] = x
+
+    def cover(self, c):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        L[R[c]] = L[c]
+        R[L[c]] = R[c]
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                U[D[j]] = U[j]
+                D[U[j]] = D[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def uncover(self, c):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                U[D[j]] = j
+                D[U[j]] = j
+                j = L[j]
+            i = U[i]
+        L[R[c]] = c
+        R[L[c]] = c
+
+    def solve(self, limit=1, deadline=None, stop=None):
+        """
+        Find exact covers, always branching on the column with the fewest rows.
+        Input: The number of solutions to stop at, or None to find them all, an optional
+               time.monotonic() deadline checked at every node, and an optional function polled every
+               STOP_INTERVAL nodes; the search ends early, with the solutions found so far, once it returns True.
+        Output: A list of solutions, each a list of row labels.
+        """
+        self.nodes = 0
+        self.deadline = deadline
+        self.stop = stop
+        solutions = []
+        partial = []
+        self._search(partial, solutions, limit)
+        return solutions
+
+    def _search(self, partial, solutions, limit):
+        self.nodes += 1
+        check_deadline(self.deadline)
+        if self.stop is not None and self.nodes % STOP_INTERVAL == 0 and self.stop():
+            return True
+        R, D, C, S = self.R, self.D, self.C, self.S
+        if R[0] == 0:
+            solutions.append(list(partial))
+            return limit is not None and len(solutions) >= limit
+
+        c = R[0]
+        best = c
+        while c != 0:
+            if S[c] < S[best]:
+                best = c
+                if S[c] < 2:
+                    break
+            c = R[c]
+        if S[best] == 0:
+            return False
+
+        self.cover(best)
+        r = D[best]
+        while r != best:
+            partial.append(self.row[r])
+            j = R[r]
+            while j != r:
+                self.cover(C[j])
+                j = R[j]
+            done = self._search(partial, solutions, limit)
+            j = self.L[r]
+            while j != r:
+                self.uncover(C[j])
+                j = self.L[j]
+            partial.pop()
+            if done:
+                self.uncover(best)
+                return True
+            r = D[r]
+        self.uncover(best)
+        return False
+
+
+def build(values, topology=None):
+    """
+    Build the exact cover matrix of a sudoku.
+    Input: A sudoku in dictionary form, and its Topology (the default 9x9 board if None).
+           Only the candidates left in every box become rows.
+    Output: A DancingLinks matrix whose row labels are (box, digit) pairs.
+    """
+    topology = topology or default_topology
+    n = topology.n
+    n_boxes = len(topology.boxes)
+    unit_index = dict((id(unit), u) for u, unit in enumerate(topology.unitlist))
+    digit_index = dict((d, k) for k, d in enumerate(topology.digits))
+
+    matrix = DancingLinks(n_boxes + len(topology.unitlist) * n)
+    for i, box in enumerate(topology.boxes):
+        unit_columns = [n_boxes + unit_index[id(unit)] * n + 1 for unit in topology.units[box]]
+        for d in values[box]:
+            k = digit_index[d]
+            matrix.add_row([i + 1] + [col + k for col in unit_columns], (box, d))
+    return matrix
+
+
+def search_values(values, topology=None, deadline=None):
+    """
+    Solve a sudoku in dictionary form with Dancing Links.
+    Input: A sudoku in dictionary form, its Topology (the default 9x9 board if None) and an optional deadline.
+    Output: The solved sudoku in dictionary form, or False if no solution exists.
+    """
+    solutions = build(values, topology).solve(1, deadline)
+    if not solutions:
+        return False
+    return dict(solutions[0])
+
+
+def count_solutions(values, limit=None, topology=None, stop=None):
+    """
+    Count the solutions of a sudoku with Dancing Links.
+    Input: A sudoku in dictionary form, the number of solutions to stop counting at (None for all),
+           the Topology of the sudoku and an optional stop function, see DancingLinks.solve().
+    Output: The number of solutions found, at most limit.
+    """
+    return len(build(values, topology).solve(limit, stop=stop))
@@ -0,0 +1,211 @@
+"""
+Puzzle generator.
+
+Fills a random valid grid of a topology (the diagonal units included) with the Dancing Links backend,
+then removes clues in random order, keeping every removal that leaves the puzzle with exactly one
+solution, until the target clue count is reached or no clue can go. Puzzles are rated by the
+strategies needed to solve them:
+
+    easy: eliminate() and only_choice() (naked and hidden singles) solve it.
+    medium: the full adaptive pipeline of solution.STRATEGIES solves it.
+    hard: search() has to guess.
+
+Every puzzle is built from its own random.Random seeded by (seed, index), so a seed always gives the
+same puzzles, whether they are generated in one process or on a pool.
+
+Example:
+    python generator.py 1000 --difficulty hard --seed 7 --workers 8 > puzzles.txt
+"""
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import argparse
+import os
+import random
+import sys
+
+import dlx
+import solution
+from utils import default_topology, get_topology, grid_string, grid_values
+
+# grid is the puzzle string ('.' for empty boxes), solution its solved grid string.
+Puzzle = namedtuple('Puzzle', ['grid', 'solution', 'clues', 'difficulty'])
+
+# difficulty -> strategies that must solve the puzzle without search, None for puzzles that need search
+DIFFICULTIES = {
+    'easy': ('eliminate', 'only_choice'),
+    'medium': tuple(sorted(solution.STRATEGIES)),
+    'hard': None,
+}
+
+
+def random_solution(rng, topology=None):
+    """
+    Return a random solved grid of a topology, in dictionary form.
+    Every box starts with its digits in random order, so Dancing Links tries them in that order.
+    """
+    topology = topology or default_topology
+    values = dict((box, ''.join(rng.sample(topology.digits, topology.n))) for box in topology.boxes)
+    return dlx.search_values(values, topology)
+
+
+def _reduce(grid, strategies, topology):
+    return solution.reduce_puzzle(grid_values(grid, topology), topology=topology, strategies=strategies)
+
+
+def _solved_by(grid, strategies, topology):
+    values = _reduce(grid, strategies, topology)
+    return values is not False and all(len(v) == 1 for v in values.values())
+
+
+def is_unique(grid, topology=None):
+    """Return True if the grid has exactly one solution."""
+    return solution.count_solutions(grid, 2, topology) == 1
+
+
+def _still_unique(grid, box, digit, topology):
+    """
+    Return True if a grid, made from a grid with a unique solution by emptying box (which held digit),
+    still has a unique solution. Any other solution would differ in box, so it is enough to show that
+    the grid has no solution without digit in box; that is a much smaller search than counting to two.
+    """
+    values = solution.eliminate(grid_values(grid, topology), topology)
+    values[box] = values[box].replace(digit, '')
+    if not values[box]:
+        return True
+    return not dlx.build(values, topology).solve(1)
+
+
+def rate(grid, topology=None):
+    """Return the difficulty of a grid with a unique solution: 'easy', 'medium' or 'hard'."""
+    topology = topology or default_topology
+    for difficulty in ('easy', 'medium'):
+        if _solved_by(grid, DIFFICULTIES[difficulty], topology):
+            return difficulty
+    return 'hard'
+
+
+def _dig(solved, rng, clues, difficulty, topology):
+    """Remove clues from a solved grid string in random order; return the puzzle string (with a unique solution)."""
+    strategies = DIFFICULTIES[difficulty] if difficulty is not None else None
+    grid = list(solved)
+    remaining = len(grid)
+    order = list(range(len(grid)))
+    rng.shuffle(order)
+    for i in order:
+        if clues is not None and remaining <= clues:
+            break
+        grid[i] = '.'
+        candidate = ''.join(grid)
+        if strategies is not None:
+            # a puzzle the strategies solve without search has a unique solution
+            keep = _solved_by(candidate, strategies, topology)
+        else:
+            keep = _still_unique(candidate, topology.boxes[i], solved[i], topology)
+        if keep:
+            remaining -= 1
+        else:
+            grid[i] = solved[i]
+    return ''.join(grid)
+
+
+def generate(clues=None, difficulty=None, rng=None, topology=None, attempts=100):
+    """
+    Generate a puzzle with a unique solution.
+    Args:
+        clues(int): the number of clues to stop removing at; as few as possible if None.
+        difficulty(string): one of the keys of DIFFICULTIES, or None for any difficulty.
+        rng(random.Random): the source of randomness, a fresh random.Random() if None.
+        topology(Topology): the board, from utils.get_topology(). The default 9x9 diagonal board if None.
+        attempts(int): the number of solved grids to try before giving up.
+    Returns:
+        A Puzzle.
+    Raises:
+        RuntimeError: no puzzle with the clue count and difficulty was found in attempts tries.
+    """
+    if difficulty is not None and difficulty not in DIFFICULTIES:
+        raise ValueError('Unknown difficulty %r, expected one of %s' % (difficulty, ', '.join(sorted(DIFFICULTIES))))
+    topology = topology or default_topology
+    rng = rng or random.Random()
+    for _ in range(attempts):
+        solved = grid_string(random_solution(rng, topology), topology)
+        grid = _dig(solved, rng, clues, difficulty, topology)
+        n_clues = len(grid) - grid.count('.')
+        if clues is not None and n_clues > clues:
+            continue
+        rating = rate(grid, topology)
+        if difficulty is None or rating == difficulty:
+            return Puzzle(grid, solved, n_clues, rating)
+    raise RuntimeError('No %s puzzle with %s clues found in %d attempts' % (
+        difficulty or 'unique', clues if clues is not None else 'the fewest', attempts))
+
+
+def _rng(seed, index):
+    """Return the random.Random of the puzzle at index."""
+    return random.Random('%d:%d' % (seed, index))
+
+
+def _generate_chunk(seed, start, count, clues, difficulty, topology):
+    """Generate the puzzles start..start+count-1 of a seed."""
+    return [generate(clues, difficulty, _rng(seed, i), topology) for i in range(start, start + count)]
+
+
+def generate_many(count, clues=None, difficulty=None, seed=None, workers=None, chunksize=16, topology=None):
+    """
+    Generate many puzzles, on a pool of worker processes.
+    Args:
+        count(int): the number of puzzles.
+        clues, difficulty: see generate().
+        seed(int): the seed of the run; a random seed if None. The same seed gives the same puzzles.
+        workers(int): number of worker processes, os.cpu_count() if None. With 0 or 1 the puzzles are
+            generated in the calling process.
+        chunksize(int): number of puzzles generated by a worker at a time.
+        topology(Topology): the board, the default 9x9 diagonal board if None.
+    Returns:
+        A generator of Puzzle, in order.
+    """
+    if chunksize < 1:
+        raise ValueError('chunksize must be at least 1')
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = ((start, min(chunksize, count - start)) for start in range(0, count, chunksize))
+
+    if workers <= 1:
+        for start, size in chunks:
+            for puzzle in _generate_chunk(seed, start, size, clues, difficulty, topology):
+                yield puzzle
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque(pool.submit(_generate_chunk, seed, start, size, clues, difficulty, topology)
+                        for start, size in islice(chunks, workers * 2))
+        while pending:
+            for puzzle in pending.popleft().result():
+                yield puzzle
+            for start, size in islice(chunks, 1):
+                pending.append(pool.submit(_generate_chunk, seed, start, size, clues, difficulty, topology))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate sudoku puzzles with a unique solution, one per line.')
+    parser.add_argument('count', type=int, help='number of puzzles')
+    parser.add_argument('--clues', type=int, help='number of clues to stop removing at (default: as few as possible)')
+    parser.add_argument('--difficulty', choices=sorted(DIFFICULTIES), help='difficulty bucket (default: any)')
+    parser.add_argument('--seed', type=int, help='seed; the same seed gives the same puzzles (default: random)')
+    parser.add_argument('--size', type=int, default=9, choices=(4, 9, 16, 25), help='side of the board (default: 9)')
+    parser.add_argument('--plain', action='store_true', help='the diagonals are not units (plain sudoku)')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes, 0 for one per core (default: 1)')
+    parser.add_argument('--chunksize', type=int, default=16, help='puzzles per worker task (default: 16)')
+    args = parser.parse_args(argv)
+
+    topology = get_topology(args.size, not args.plain)
+    for puzzle in generate_many(args.count, args.clues, args.difficulty, args.seed, args.workers or None,
+                                args.chunksize, topology):
+        sys.stdout.write(puzzle.grid + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,34 @@ import pygame
 
 from pygame import *
 
+# Rendering caches shared by every square: fonts by (name, size), rendered numbers by (text, color)
+# and rounded tiles by (size, color, radius). Building them is far slower than blitting them.
+_fonts = {}
+_glyphs = {}
+_tiles = {}
+
+
+def get_font(name='opensans', size=21):
+    """Return the font, loading it once."""
+    font = _fonts.get((name, size))
+    if font is None:
+        font = _fonts[(name, size)] = pygame.font.SysFont(name, size)
+    return font
+
+
+def clear_fonts():
+    """Forget the loaded fonts; they are only valid until pygame.quit()."""
+    _fonts.clear()
+
+
+def render_text(text, color=(255, 255, 255)):
+    """Return the surface of text in the square font, rendering it once."""
+    glyph = _glyphs.get((text, color))
+    if glyph is None:
+        glyph = _glyphs[(text, color)] = get_font().render(text, 1, color)
+    return glyph
+
+
 def AAfilledRoundedRect(surface,rect,color,radius=0.4):
 
     """
@@ -11,14 +39,25 @@ def AAfilledRoundedRect(surface,rect,color,radius=0.4):
     rect    : rectangle
     color   : rgb or rgba
     radius  : 0 <= radius <= 1
+
+    The tile of every size, color and radius is built once and blitted from then on.
     """
 
-    rect         = Rect(rect)
+    rect = Rect(rect)
+    key = (rect.size, tuple(color), radius)
+    rectangle = _tiles.get(key)
+    if rectangle is None:
+        rectangle = _tiles[key] = _rounded_rect(rect.size, color, radius)
+    return surface.blit(rectangle, rect.topleft)
+
+
+def _rounded_rect(size,color,radius):
+    """Build the surface of an antialiased rounded rectangle."""
+
+    rect         = Rect((0,0),size)
     color        = Color(*color)
     alpha        = color.a
     color.a      = 0
-    pos          = rect.topleft
-    rect.topleft = 0,0
     rectangle    = Surface(rect.size,SRCALPHA)
 
     circle       = Surface([min(rect.size)*3]*2,SRCALPHA)
@@ -39,22 +78,18 @@ def AAfilledRoundedRect(surface,rect,color,radius=0.4):
     rectangle.fill(color,special_flags=BLEND_RGBA_MAX)
     rectangle.fill((255,255,255,alpha),special_flags=BLEND_RGBA_MIN)
 
-    return surface.blit(rectangle,pos)
+    return rectangle
 
 class SudokuSquare:
     """A sudoku square class."""
     def __init__(self, number=None, offsetX=0, offsetY=0, edit="Y", xLoc=0, yLoc=0):
-        if number != None:
-            number = str(number)
-            self.color = (2, 204, 186)
-        else:
-            number = ""
-            self.color = (255, 255, 255)
         # print("FONTS", pygame.font.get_fonts())
-        self.font = pygame.font.SysFont('opensans', 21)
-        self.text = self.font.render(number, 1, (255, 255, 255))
-        self.textpos = self.text.get_rect()
-        self.textpos = self.textpos.move(offsetX + 17, offsetY + 4)
+        self.font = get_font()
+        self.number = None
+        self.text = None
+        self.offsetX = offsetX
+        self.offsetY = offsetY
+        self.setNumber(number)
 
         # self.collide = pygame.Surface((25, 22))
         # self.collide = self.collide.convert()
@@ -67,12 +102,29 @@ class SudokuSquare:
         self.edit = edit
         self.xLoc = xLoc
         self.yLoc = yLoc
-        self.offsetX = offsetX
-        self.offsetY = offsetY
+        self.rect = Rect(offsetX, offsetY, 45, 40)
+
+    def setNumber(self, number):
+        """Show number (None for an empty square), reusing the cached glyph. Returns True if it changed."""
+        if number == self.number and self.text is not None:
+            return False
+        self.number = number
+        if number != None:
+            self.color = (2, 204, 186)
+        else:
+            self.color = (255, 255, 255)
+        self.text = render_text("" if number == None else str(number))
+        self.textpos = self.text.get_rect().move(self.offsetX + 17, self.offsetY + 4)
+        return True
+
+    def area(self):
+        """The part of the screen draw() paints."""
+        return self.rect.union(self.textpos)
 
-    def draw(self):
-        screen = pygame.display.get_surface()
-        AAfilledRoundedRect(screen, (self.offsetX, self.offsetY, 45, 40), self.color)
+    def draw(self, screen=None):
+        if screen is None:
+            screen = pygame.display.get_surface()
+        AAfilledRoundedRect(screen, self.rect, self.color)
 
         # screen.blit(self.collide, self.collideRect)
         screen.blit(self.text, self.textpos)
@@ -104,7 +156,7 @@ class SudokuSquare:
             number = ""
         
         if self.edit == "Y":
-            self.text = self.font.render(number, 1, (0, 0, 0))
+            self.text = render_text(number, (0, 0, 0))
             self.draw()
             return 0
         else:
@@ -0,0 +1,177 @@
+"""
+Asyncio solving service.
+
+SolverService runs solution.solve() on a pool of executors from asyncio code, with a bound on how many
+solves run at once, a deadline per request and back-pressure: requests that find the queue of waiting
+requests full are rejected at once with ServiceBusy instead of piling up. The deadline is enforced by
+the solvers themselves (see utils.check_deadline()), so a runaway grid stops its worker soon after its
+deadline instead of blocking it.
+
+LocalClient calls a service in the same process and returns the responses a web handler would send.
+
+Example:
+    async with SolverService(max_concurrency=4, timeout=0.5) as service:
+        values = await service.solve(grid)
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import time
+
+import solution
+from utils import SolveTimeout, default_topology, grid_string
+
+
+class ServiceBusy(Exception):
+    """Raised when a request arrives while the queue of waiting requests is full."""
+
+
+def _solve_before(grid, engine, topology, timeout):
+    """Solve a grid in an executor, giving up timeout seconds after the worker picked it up."""
+    return solution.solve(grid, engine, topology=topology, deadline=time.monotonic() + timeout)
+
+
+class SolverService(object):
+    """
+    Runs solves on an executor pool, at most max_concurrency at once.
+
+    Args:
+        max_concurrency(int): number of solves running at once, and the size of the default pool.
+        max_queue(int): number of requests allowed to wait for a free slot; more raise ServiceBusy.
+        timeout(float): default time in seconds a request may take, waiting included.
+        engine(string): the engine of solution.solve().
+        topology(Topology): the Topology of the grids, the default 9x9 board if None.
+        processes(bool): run the solves on a process pool instead of a thread pool.
+        executor: an executor to run the solves on instead of a pool owned by the service.
+
+    Counters:
+        solved, unsolvable, timeouts, rejected, errors: number of requests that ended each way.
+    """
+
+    def __init__(self, max_concurrency=4, max_queue=64, timeout=1.0, engine='dict', topology=None,
+                 processes=False, executor=None):
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be at least 1')
+        solution.get_engine(engine)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.engine = engine
+        self.topology = topology or default_topology
+        self.processes = processes
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._slots = None
+        self.waiting = 0
+        self.running = 0
+        self.solved = 0
+        self.unsolvable = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def start(self):
+        """Create the executor pool, if the service owns it. Called by solve() if needed."""
+        if self._executor is None:
+            pool = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.max_concurrency)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    def close(self):
+        """Shut down the executor pool, if the service owns it, waiting for the running solves."""
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def solve(self, grid, timeout=None):
+        """
+        Solve a grid on the pool.
+        Args:
+            grid(string): a string representing a sudoku grid.
+            timeout(float): time in seconds the request may take, waiting included; the service default if None.
+        Returns:
+            The dictionary representation of the final sudoku grid. False if no solution exists.
+        Raises:
+            ServiceBusy: max_queue requests are already waiting.
+            SolveTimeout: the request did not finish in time.
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        timeout = self.timeout if timeout is None else timeout
+        deadline = loop.time() + timeout
+
+        if self.waiting + self.running >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise ServiceBusy('%d requests already waiting' % self.waiting)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise SolveTimeout('Request waited longer than its deadline')
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise SolveTimeout('Request waited longer than its deadline')
+            values = await loop.run_in_executor(self._executor, _solve_before, grid, self.engine, self.topology,
+                                                remaining)
+        except SolveTimeout:
+            self.timeouts += 1
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.running -= 1
+            self._slots.release()
+        if values is False:
+            self.unsolvable += 1
+        else:
+            self.solved += 1
+        return values
+
+    def stats(self):
+        """Return the counters and the current load as a dictionary."""
+        return {'waiting': self.waiting, 'running': self.running, 'solved': self.solved,
+                'unsolvable': self.unsolvable, 'timeouts': self.timeouts, 'rejected': self.rejected,
+                'errors': self.errors}
+
+
+class LocalClient(object):
+    """
+    In-process client of a SolverService, answering with the responses a web handler would send.
+    Every response is a dictionary with a 'status' ('solved', 'unsolvable', 'timeout', 'busy' or 'invalid')
+    and a 'solution' grid string, None unless the grid was solved.
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    async def solve(self, grid, timeout=None):
+        """Send one grid to the service and return its response."""
+        try:
+            values = await self.service.solve(grid, timeout)
+        except ServiceBusy:
+            return {'status': 'busy', 'solution': None}
+        except SolveTimeout:
+            return {'status': 'timeout', 'solution': None}
+        except Exception as e:
+            return {'status': 'invalid', 'solution': None, 'error': '%s: %s' % (type(e).__name__, e)}
+        if values is False:
+            return {'status': 'unsolvable', 'solution': None}
+        return {'status': 'solved', 'solution': grid_string(values, self.service.topology)}
+
+    async def solve_many(self, grids, timeout=None):
+        """Send grids concurrently and return their responses in order."""
+        return await asyncio.gather(*[self.solve(grid, timeout) for grid in grids])
@@ -1,12 +1,22 @@
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import combinations
+import multiprocessing
+import time
+
 from utils import *
+from branching import get_policy
+import bitmask
+import dlx
 
 
-def eliminate(values):
+def eliminate(values, topology=None):
     """
     Go through all the boxes, and whenever there is a box with a value, eliminate this value from the values of all its peers.
-    Input: A sudoku in dictionary form.
+    Input: A sudoku in dictionary form, and its Topology (the default 9x9 board if None).
     Output: The resulting sudoku in dictionary form.
     """
+    peers = (topology or default_topology).peers
     solved_values = [box for box in values.keys() if len(values[box]) == 1]
     for box in solved_values:
         digit = values[box]
@@ -15,67 +25,315 @@ def eliminate(values):
     return values
 
 
-def only_choice(values):
+def only_choice(values, topology=None):
     """
     Go through all the units, and whenever there is a unit with a value that only fits in one box, assign the value to this box.
-    Input: A sudoku in dictionary form.
+    Input: A sudoku in dictionary form, and its Topology (the default 9x9 board if None).
     Output: The resulting sudoku in dictionary form.
     """
-    for unit in unitlist:
-        for digit in '123456789':
+    topology = topology or default_topology
+    for unit in topology.unitlist:
+        for digit in topology.digits:
             dplaces = [box for box in unit if digit in values[box]]
             if len(dplaces) == 1:
                 assign_value(values, dplaces[0], digit)
     return values
 
 
-def naked_twins(values):
+def naked_twins(values, units=None, topology=None):
     """Eliminate values using the naked twins strategy.
     Args:
         values(dict): a dictionary of the form {'box_name': '123456789', ...}
+        units(list): the units to look for twins in. All units of the topology if None.
+        topology(Topology): the board of values, the default 9x9 board if None.
 
     Returns:
         the values dictionary with the naked twins eliminated from peers.
     """
-    def naked_twins_single_unit(unit, values=values):
-        # finds all naked twins in the particular unit. Eliminates unneccecary values from unit
+    if units is None:
+        units = (topology or default_topology).unitlist
+    for unit in units:
+        # group the two-candidate boxes of the unit by their value; any value held twice is a naked twin
+        seen = set()
+        twins = []
+        for box in unit:
+            value = values[box]
+            if len(value) == 2:
+                if value in seen and value not in twins:
+                    twins.append(value)
+                seen.add(value)
 
-        def remove_twins(unit, twins, values=values):
-            # When the naked twin is found in some unit - eliminates twin's values from the unit
-            for u in unit:
-                if values[u] != twins:
-                    values[u] = values[u].replace(twins[0], '').replace(twins[1], '')
-            return values
+        for twin in twins:
+            for box in unit:
+                value = values[box]
+                if value != twin and (twin[0] in value or twin[1] in value):
+                    values[box] = value.replace(twin[0], '').replace(twin[1], '')
 
-        # find all naked twins
-        twins = list(set([values[i] for i in unit for j in unit if ( (values[i]==values[j]) and (len(values[i])==2) and (i!=j) )]))
+    return values
 
-        for twin in twins:
-            values = remove_twins(unit, twin)
 
-        return values
+def naked_subsets(values, size, units=None, topology=None):
+    """Eliminate values using naked subsets of the given size (3 for triples, 4 for quads).
+    A naked subset is a group of size boxes in a unit whose candidates together are exactly size digits;
+    those digits can be removed from every other box of the unit.
+    Args:
+        values(dict): a dictionary of the form {'box_name': '123456789', ...}
+        size(int): the number of boxes in the subset.
+        units(list): the units to look for subsets in. All units of the topology if None.
+        topology(Topology): the board of values, the default 9x9 board if None.
 
-    for u in unitlist:
-        values = naked_twins_single_unit(u)
+    Returns:
+        the values dictionary with the naked subsets eliminated from peers.
+    """
+    if units is None:
+        units = (topology or default_topology).unitlist
+    for unit in units:
+        candidates = [box for box in unit if 1 < len(values[box]) <= size]
+        if len(candidates) < size:
+            continue
+        for subset in combinations(candidates, size):
+            digits = set(''.join(values[box] for box in subset))
+            if len(digits) != size:
+                continue
+            for box in unit:
+                if box not in subset and not digits.isdisjoint(values[box]):
+                    values[box] = ''.join(d for d in values[box] if d not in digits)
 
     return values
 
 
+def naked_triples(values, units=None, topology=None):
+    """Eliminate values using the naked triples strategy. See naked_subsets()."""
+    return naked_subsets(values, 3, units, topology)
+
+
+def naked_quads(values, units=None, topology=None):
+    """Eliminate values using the naked quads strategy. See naked_subsets()."""
+    return naked_subsets(values, 4, units, topology)
 
-def reduce_puzzle(values):
+
+def hidden_pairs(values, units=None, topology=None):
+    """Eliminate values using the hidden pairs strategy.
+    A hidden pair is two digits that only fit in the same two boxes of a unit; every other digit can be
+    removed from those two boxes.
+    Args:
+        values(dict): a dictionary of the form {'box_name': '123456789', ...}
+        units(list): the units to look for pairs in. All units of the topology if None.
+        topology(Topology): the board of values, the default 9x9 board if None.
+
+    Returns:
+        the values dictionary with the hidden pairs reduced to their two digits.
     """
-    Iterate eliminate() and only_choice(). If at some point, there is a box with no available values, return False.
-    If the sudoku is solved, return the sudoku.
-    If after an iteration of both functions, the sudoku remains the same, return the sudoku.
-    Input: A sudoku in dictionary form.
+    topology = topology or default_topology
+    if units is None:
+        units = topology.unitlist
+    for unit in units:
+        # group the digits that fit in exactly two boxes by those boxes; any pair of boxes held twice is a hidden pair
+        places = {}
+        for digit in topology.digits:
+            dplaces = tuple(box for box in unit if digit in values[box])
+            if len(dplaces) == 2:
+                places.setdefault(dplaces, []).append(digit)
+        for dplaces, digits in places.items():
+            if len(digits) != 2:
+                continue
+            pair = ''.join(digits)
+            for box in dplaces:
+                if len(values[box]) > 2:
+                    values[box] = ''.join(d for d in values[box] if d in pair)
+    return values
+
+
+def _intersections(topology):
+    """Return the (unit, other unit, boxes in both) triples of a topology whose units share more than one box."""
+    overlaps = _overlaps.get(topology)
+    if overlaps is None:
+        overlaps = []
+        for unit in topology.unitlist:
+            for other in topology.unitlist:
+                if other is not unit:
+                    shared = set(unit) & set(other)
+                    if len(shared) > 1:
+                        overlaps.append((unit, other, shared))
+        _overlaps[topology] = overlaps
+    return overlaps
+
+
+_overlaps = {}
+
+
+def _locked_candidates(values, topology, pointing):
+    """
+    Remove a digit from the rest of a unit when, in an overlapping unit, it only fits in the overlap.
+    With pointing, the digit is locked by a square unit and removed from a row, column or diagonal;
+    otherwise it is locked by a row, column or diagonal and removed from a square unit.
+    """
+    squares = set(id(unit) for unit in topology.square_units)
+    for unit, other, shared in _intersections(topology):
+        if (id(unit) in squares) != pointing or (id(other) in squares) == pointing:
+            continue
+        for digit in topology.digits:
+            dplaces = [box for box in unit if digit in values[box]]
+            if len(dplaces) < 2 or not shared.issuperset(dplaces):
+                continue
+            for box in other:
+                if box not in shared and digit in values[box]:
+                    values[box] = values[box].replace(digit, '')
+    return values
+
+
+def pointing_pairs(values, topology=None):
+    """
+    Eliminate values using pointing pairs and triples: when a digit only fits in one row, column or
+    diagonal inside a square unit, it can be removed from the rest of that row, column or diagonal.
+    Input: A sudoku in dictionary form, and its Topology (the default 9x9 board if None).
     Output: The resulting sudoku in dictionary form.
     """
+    return _locked_candidates(values, topology or default_topology, True)
+
+
+def box_line_reduction(values, topology=None):
+    """
+    Eliminate values using box/line reduction: when a digit only fits in one square unit inside a row,
+    column or diagonal, it can be removed from the rest of that square unit.
+    Input: A sudoku in dictionary form, and its Topology (the default 9x9 board if None).
+    Output: The resulting sudoku in dictionary form.
+    """
+    return _locked_candidates(values, topology or default_topology, False)
+
+
+# Strategies of the adaptive reduce_puzzle() pipeline. Every strategy function takes a sudoku in dictionary
+# form and a topology keyword argument, and returns the sudoku in dictionary form. The pipeline runs the
+# strategies in order of increasing cost. only_choice() is the hidden singles strategy.
+Strategy = namedtuple('Strategy', ['name', 'cost', 'function'])
+
+STRATEGIES = dict((strategy.name, strategy) for strategy in (
+    Strategy('eliminate', 1, eliminate),
+    Strategy('only_choice', 2, only_choice),
+    Strategy('naked_twins', 3, naked_twins),
+    Strategy('hidden_pairs', 4, hidden_pairs),
+    Strategy('pointing_pairs', 5, pointing_pairs),
+    Strategy('box_line_reduction', 5, box_line_reduction),
+    Strategy('naked_triples', 6, naked_triples),
+    Strategy('naked_quads', 8, naked_quads),
+))
+
+
+def register_strategy(name, function, cost):
+    """Add a strategy to STRATEGIES, or replace the one registered under name."""
+    STRATEGIES[name] = Strategy(name, cost, function)
+
+
+def get_pipeline(strategies):
+    """
+    Look up strategies by name.
+    Input: An iterable of names, keys of STRATEGIES. It must include 'eliminate': no other strategy
+           removes the digit of a solved box from its peers, so without it a board full of clashing
+           digits would pass for solved.
+    Output: A list of Strategy, cheapest first.
+    """
+    pipeline = []
+    for name in strategies:
+        try:
+            pipeline.append(STRATEGIES[name])
+        except KeyError:
+            raise ValueError('Unknown strategy %r, expected one of %s' % (name, ', '.join(sorted(STRATEGIES))))
+    if STRATEGIES['eliminate'] not in pipeline:
+        raise ValueError("Strategies must include 'eliminate'")
+    return sorted(pipeline, key=lambda strategy: (strategy.cost, strategy.name))
+
+
+_naked_names = {3: 'naked_triples', 4: 'naked_quads'}
+
+
+def _apply(profiler, name, strategy, values, *args, **kwargs):
+    """Run a strategy on values, reporting the candidates it removed and its time to profiler if not None."""
+    if profiler is None:
+        return strategy(values, *args, **kwargs)
+    before = sum(len(v) for v in values.values())
+    start = time.perf_counter()
+    values = strategy(values, *args, **kwargs)
+    elapsed = time.perf_counter() - start
+    profiler.strategy(name, before - sum(len(v) for v in values.values()), elapsed)
+    return values
+
+
+def _consistent(values, topology):
+    """Return True if no unit of a board with one digit in every box holds a digit twice."""
+    return all(len(set(values[box] for box in unit)) == len(unit) for unit in topology.unitlist)
+
+
+def _reduce_adaptive(values, pipeline, topology, deadline, profiler):
+    """
+    Run the strategies of pipeline cheapest first. Whenever a strategy removes candidates, start over
+    from the cheapest one; stop when none of them removes anything, or when the sudoku is solved.
+    """
+    n_boxes = len(topology.boxes)
+    count = sum(len(v) for v in values.values())
+    sweep = 0
+    i = 0
+    while i < len(pipeline):
+        check_deadline(deadline)
+        if i == 0 and profiler is not None:
+            sweep += 1
+            profiler.sweep(sweep)
+        strategy = pipeline[i]
+        values = _apply(profiler, strategy.name, strategy.function, values, topology=topology)
+        lengths = [len(v) for v in values.values()]
+        if 0 in lengths:
+            return False
+        after = sum(lengths)
+        if after == n_boxes:
+            return values if _consistent(values, topology) else False
+        i = 0 if after < count else i + 1
+        count = after
+    return values
+
+
+def reduce_puzzle(values, naked=2, topology=None, deadline=None, strategies=None):
+    """
+    Iterate eliminate(), the naked subset strategies and only_choice(). If at some point, there is a box with no available values, return False.
+    If the sudoku is solved, return the sudoku.
+    If after an iteration of all functions, the sudoku remains the same, return the sudoku.
+    The naked strategies only revisit units with a box that changed since their previous pass.
+    Every strategy call is reported to the Profiler of utils.profiling(), if one is active.
+    Input: A sudoku in dictionary form, the largest naked subset to look for
+           (2 for twins only, 3 to add triples, 4 to add triples and quads),
+           its Topology (the default 9x9 board if None), an optional time.monotonic() deadline and
+           optionally the names of the strategies to run (keys of STRATEGIES). Given strategies, naked is
+           ignored and the adaptive pipeline runs instead: cheap strategies first, the more expensive ones
+           only once the cheaper ones stop removing candidates, until none of them removes anything.
+    Output: The resulting sudoku in dictionary form. Raises SolveTimeout once the deadline has passed.
+    """
+    topology = topology or default_topology
+    boxes = topology.boxes
+    unitlist = topology.unitlist
+    profiler = active_profiler()
+    if profiler is not None:
+        profiler.reduction()
+    if strategies is not None:
+        return _reduce_adaptive(values, get_pipeline(strategies), topology, deadline, profiler)
     stalled = False
+    before_naked = None
+    iteration = 0
     while not stalled:
+        check_deadline(deadline)
+        if profiler is not None:
+            iteration += 1
+            profiler.sweep(iteration)
         solved_values_before = len([box for box in values.keys() if len(values[box]) == 1])
-        values = eliminate(values)
-        values = naked_twins(values)
-        values = only_choice(values)
+        values = _apply(profiler, 'eliminate', eliminate, values, topology)
+        if before_naked is None:
+            dirty = unitlist
+        else:
+            changed = set(box for box in boxes if values[box] != before_naked[box])
+            dirty = [unit for unit in unitlist if not changed.isdisjoint(unit)]
+        before_naked = values.copy()
+        values = _apply(profiler, 'naked_twins', naked_twins, values, dirty)
+        for size in range(3, naked + 1):
+            values = _apply(profiler, _naked_names.get(size, 'naked_subsets_%d' % size), naked_subsets, values,
+                            size, dirty)
+        values = _apply(profiler, 'only_choice', only_choice, values, topology)
         solved_values_after = len([box for box in values.keys() if len(values[box]) == 1])
         stalled = solved_values_before == solved_values_after
         if len([box for box in values.keys() if len(values[box]) == 0]):
@@ -83,59 +341,279 @@ def reduce_puzzle(values):
     return values
 
 
-def search(values):
-    def check_done(values):
-        for b in boxes:
-            if len(values[b]) > 1:
-                return False
-        return True
+def search(values, engine='dict', naked=2, topology=None, branching=None, deadline=None, strategies=None):
+    """
+    Solve the sudoku with depth-first search, reducing the puzzle before every branch.
+    Input: A sudoku in dictionary form, the name of the engine to use (see ENGINES), for the dict engine
+           the largest naked subset reduce_puzzle() looks for, the Topology of the sudoku
+           (the default 9x9 board if None) and, for the dict engine, the branching policy: a name from
+           branching.POLICIES or a branching.Branching instance, which then holds the node counts,
+           an optional time.monotonic() deadline checked at every node and, for the dict engine, the names
+           of the strategies reduce_puzzle() runs (its default pipeline if None).
+    Output: The solved sudoku in dictionary form, or False if no solution exists.
+            Raises SolveTimeout once the deadline has passed.
+    """
+    if engine != 'dict':
+        if branching is not None:
+            raise ValueError('Branching policies are only supported by the dict engine')
+        if strategies is not None:
+            raise ValueError('Strategies are only supported by the dict engine')
+        if naked != 2:
+            raise ValueError('Naked subsets larger than twins are only supported by the dict engine')
+        return get_engine(engine)(values, topology=topology, deadline=deadline)
+    return SearchDriver(values, naked, topology, branching, strategies).run(deadline=deadline)
 
-    # reduce the puzzle
-    values = reduce_puzzle(values)
 
-    if values is False:
-        return False
+class SearchDriver(object):
+    """
+    Iterative depth-first search of the dict engine, with an explicit stack of frames instead of recursion.
+    Visits the same nodes in the same order as the recursive search() always did, but can stop after a
+    budget of nodes or time and be resumed later with another run(), or saved with save() and rebuilt with
+    restore() elsewhere.
+
+    Every frame is a list [reduced values, branching box, digits to try, index of the next digit].
+    pending holds the next node to reduce, a sudoku in dictionary form, or None.
+
+    Counters:
+        nodes: number of search nodes visited, over every run().
+        peak_depth: largest number of frames on the stack.
+    """
+
+    def __init__(self, values, naked=2, topology=None, branching=None, strategies=None):
+        if strategies is not None:
+            strategies = [strategy.name for strategy in get_pipeline(strategies)]
+        self.naked = naked
+        self.strategies = strategies
+        self.topology = topology or default_topology
+        self.policy = get_policy(branching)
+        self.stack = []
+        self.pending = values
+        self.result = None
+        self.nodes = 0
+        self.peak_depth = 0
+
+    @property
+    def done(self):
+        """True once the search found a solution or proved there is none."""
+        return self.result is not None
+
+    def _failed(self):
+        """The node below the top frame failed; drop every frame whose digits are all used up."""
+        stack = self.stack
+        while stack:
+            values, box, digits, index = stack[-1]
+            self.policy.failed(values, box, self.topology)
+            if index < len(digits):
+                return
+            stack.pop()
+        self.result = False
+
+    def run(self, max_nodes=None, max_time=None, deadline=None):
+        """
+        Continue the search.
+        Input: The number of nodes and the time in seconds this call may use (no limit if None), and an
+               optional time.monotonic() deadline after which the search raises SolveTimeout.
+        Output: The solved sudoku in dictionary form, False if no solution exists, or None if the budget ran
+                out first; call run() again to resume.
+        """
+        topology = self.topology
+        policy = self.policy
+        stack = self.stack
+        profiler = active_profiler()
+        stop = None if max_time is None else time.monotonic() + max_time
+        visited = 0
+        while self.result is None:
+            if self.pending is None:
+                # the next digit of the top frame
+                frame = stack[-1]
+                values, box, digits, index = frame
+                frame[3] = index + 1
+                self.pending = values.copy()
+                self.pending[box] = digits[index]
+            if (max_nodes is not None and visited >= max_nodes) or (stop is not None and time.monotonic() > stop):
+                return None
+            check_deadline(deadline)
+            visited += 1
+            self.nodes += 1
+            policy.nodes += 1
+            if profiler is not None:
+                profiler.node(len(stack))
+
+            values = reduce_puzzle(self.pending, self.naked, topology, deadline, self.strategies)
+            self.pending = None
+            if values is False:
+                if not stack:
+                    self.result = False
+                else:
+                    self._failed()
+                continue
+            # Choose one of the unfilled squares, by default the first one with the fewest possibilities
+            box = policy.select(values, topology)
+            if not box:
+                self.result = values
+                del stack[:]
+                continue
+            stack.append([values, box, policy.order(values, box, topology), 0])
+            self.peak_depth = max(self.peak_depth, len(stack))
+        return self.result
+
+    def save(self):
+        """
+        Return the state of the search as a dictionary of plain values (strings, lists, dicts, ints), so it
+        can be stored as JSON or sent to another process. The branching policy is saved by name only.
+        """
+        return {
+            'size': self.topology.n,
+            'diagonal': self.topology.diagonal,
+            'naked': self.naked,
+            'strategies': self.strategies,
+            'branching': self.policy.name,
+            'stack': [list(frame) for frame in self.stack],
+            'pending': self.pending,
+            'result': self.result,
+            'nodes': self.nodes,
+            'peak_depth': self.peak_depth,
+        }
 
-    if check_done(values):
-        return values
+    @classmethod
+    def restore(cls, state):
+        """Rebuild a SearchDriver from a dictionary returned by save()."""
+        driver = cls(state['pending'], state['naked'], get_topology(state['size'], state['diagonal']),
+                     state['branching'], state.get('strategies'))
+        driver.stack = [list(frame) for frame in state['stack']]
+        driver.result = state['result']
+        driver.nodes = state['nodes']
+        driver.peak_depth = state['peak_depth']
+        return driver
 
-    # Choose one of the unfilled squares with the fewest possibilities
-    min_box = ''
-    min_len = 10
-    for b in boxes:
-        if (len(values[b]) < min_len) and (len(values[b]) > 1):
-            min_len = len(values[b])
-            min_box = b
 
-    # use recursion to solve each one of the resulting sudokus, and if one returns a value (not False), return that answer!
-    for v in values[min_box]:
-        new_values = values.copy()
-        new_values[min_box] = v
-        attempt = search(new_values)
-        if attempt:
-            return attempt
+# Engines selectable through search() and solve(). Every engine takes a sudoku in dictionary form and
+# topology and deadline keyword arguments, and returns the solved sudoku in dictionary form, or False.
+ENGINES = {
+    'dict': search,
+    'bitmask': bitmask.search_values,
+    'trail': bitmask.search_values_trail,
+    'queue': bitmask.search_values_queue,
+    'dlx': dlx.search_values,
+}
 
 
-def solve(grid):
+def get_engine(name):
+    """
+    Look up a search engine by name.
+    Input: The name of the engine, one of the keys of ENGINES.
+    Output: The search function of the engine.
+    """
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError('Unknown engine %r, expected one of %s' % (name, ', '.join(sorted(ENGINES))))
+
+
+def solve(grid, engine='dict', trace=None, topology=None, branching=None, deadline=None, strategies=None):
     """
     Find the solution to a Sudoku grid.
     Args:
         grid(string): a string representing a sudoku grid.
             Example: '2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3'
+        engine(string): the search engine to use, one of the keys of ENGINES.
+        trace(Trace): optional utils.Trace to record the assignments on. Only the dict engine records.
+        topology(Topology): the board to solve, from utils.get_topology(). The default 9x9 diagonal board if None.
+        branching: the branching policy of the dict engine, see search().
+        deadline(float): optional time.monotonic() value; the solve raises SolveTimeout once it has passed.
+        strategies(list): the names of the strategies of the dict engine, see reduce_puzzle().
     Returns:
         The dictionary representation of the final sudoku grid. False if no solution exists.
     """
-    values = grid_values(grid)
-    return search(values)
+    values = grid_values(grid, topology)
+    if trace is None:
+        return search(values, engine, topology=topology, branching=branching, deadline=deadline,
+                      strategies=strategies)
+    with recording(trace):
+        trace.record(values)
+        return search(values, engine, topology=topology, branching=branching, deadline=deadline,
+                      strategies=strategies)
+
+
+def _count(values, limit, topology, stop=None):
+    """
+    Count the solutions below values, stopping at limit: reduce_puzzle() once, then Dancing Links on the
+    candidates left. stop is an optional shared event; counting ends early once it is set.
+    """
+    values = reduce_puzzle(values, topology=topology)
+    if values is False:
+        return 0
+    return dlx.count_solutions(values, limit, topology, None if stop is None else stop.is_set)
+
+
+_manager = None
+
+
+def _stop_event():
+    """Return a new event that worker processes can poll, from a manager started once per process."""
+    global _manager
+    if _manager is None:
+        _manager = multiprocessing.Manager()
+    return _manager.Event()
+
+
+def count_solutions(grid, limit=2, topology=None, workers=None, executor=None):
+    """
+    Count the solutions of a Sudoku grid, stopping as soon as limit solutions are found.
+    Args:
+        grid(string): a string representing a sudoku grid.
+        limit(int): the number of solutions to stop at, None to count them all. With the default of 2,
+            count_solutions(grid) == 1 checks that the grid has exactly one solution.
+        topology(Topology): the board of the grid, the default 9x9 diagonal board if None.
+        workers(int): if more than 1, the branches of the first search node are counted in parallel
+            on that many worker processes.
+        executor: a long-lived process pool to count the branches on instead; it is left running.
+            Starting a pool costs more than counting most 9x9 grids, so reuse one across calls.
+    Returns:
+        The number of solutions found, at most limit.
+    """
+    topology = topology or default_topology
+    values = grid_values(grid, topology)
+    if executor is None and (not workers or workers <= 1):
+        return _count(values, limit, topology)
+
+    values = reduce_puzzle(values, topology=topology)
+    if values is False:
+        return 0
+    min_box = get_policy(None).select(values, topology)
+    if not min_box:
+        return 1
+
+    pool = executor or ProcessPoolExecutor(max_workers=workers)
+    # branches still running once the limit is reached see the event and return early
+    stop = _stop_event()
+    pending = set()
+    try:
+        for v in values[min_box]:
+            new_values = values.copy()
+            new_values[min_box] = v
+            pending.add(pool.submit(_count, new_values, limit, topology, stop))
+        total = 0
+        while pending and (limit is None or total < limit):
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            total += sum(future.result() for future in done)
+    finally:
+        stop.set()
+        for future in pending:
+            future.cancel()
+        if executor is None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    return total if limit is None else min(total, limit)
 
 
 if __name__ == '__main__':
     diag_sudoku_grid = '2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3'
-    display(solve(diag_sudoku_grid))
+    trace = Trace()
+    display(solve(diag_sudoku_grid, trace=trace))
 
     try:
         from visualize import visualize_assignments
-        visualize_assignments(assignments)
+        visualize_assignments(trace)
 
     except SystemExit:
         pass
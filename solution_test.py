@@ -1,6 +1,36 @@
+import asyncio
+import batch
+import benchmark
+import bitmask
+import branching
+import cache
+import cli
+from concurrent.futures import ProcessPoolExecutor
+import dlx
+import generator
+import gzip
+import json
+import os
+import pickle
+import random
+import service
+import subprocess
+import sys
+import tempfile
+import time
 import solution
 import unittest
 
+try:
+    import vectorized
+except ImportError:
+    vectorized = None
+
+try:
+    import PySudoku
+except ImportError:
+    PySudoku = None
+
 
 class TestNakedTwins(unittest.TestCase):
     before_naked_twins_1 = {'I6': '4', 'H9': '3', 'I2': '6', 'E8': '1', 'H3': '5', 'H7': '8', 'I7': '1', 'I4': '8',
@@ -75,6 +105,29 @@ class TestNakedTwins(unittest.TestCase):
         self.assertTrue(solution.naked_twins(self.before_naked_twins_2) in self.possible_solutions_2,
                         "Your naked_twins function produced an unexpected board.")
 
+    def test_naked_twins_selected_units(self):
+        values = solution.naked_twins(dict(self.before_naked_twins_1), units=[solution.row_units[0]])
+        self.assertEqual(values, self.before_naked_twins_1)
+
+    def test_naked_triples(self):
+        values = solution.grid_values('.' * 81)
+        values.update({'A1': '12', 'A2': '23', 'A3': '13', 'A4': '1234'})
+        values = solution.naked_triples(values)
+        self.assertEqual(values['A4'], '4')
+        self.assertEqual(values['A9'], '456789')
+        self.assertEqual(values['B2'], '456789')
+        self.assertEqual(values['A1'], '12')
+
+    def test_naked_quads(self):
+        values = solution.grid_values('.' * 81)
+        values.update({'A1': '12', 'A2': '23', 'A3': '34', 'A4': '14', 'A5': '12345'})
+        self.assertEqual(solution.naked_triples(dict(values))['A5'], '12345')
+        self.assertEqual(solution.naked_quads(values)['A5'], '5')
+
+    def test_search_with_naked_quads(self):
+        for grid in TestEngines.grids:
+            self.assertEqual(solution.search(solution.grid_values(grid), naked=4),
+                             solution.solve(grid))
 
 
 class TestDiagonalSudoku(unittest.TestCase):
@@ -94,5 +147,618 @@ class TestDiagonalSudoku(unittest.TestCase):
     def test_solve(self):
         self.assertEqual(solution.solve(self.diagonal_grid), self.solved_diag_sudoku)
 
+
+class TestEngines(unittest.TestCase):
+    grids = [
+        '2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3',
+        '26...5....5..1.24...182.5...76.381....41..657..965...........1.......7.4.1....9.3',
+        '2..9..3....371624..9....57.5.....19..8.......1.9....3..4....8.............8....23',
+        '...9..3.....71.2.......3.....64.81...8.1......29.....8.4..............6..1.56....',
+        '4.....8.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......',
+        '11...............................................................................',
+    ]
+
+    # engines that branch like the dict engine and find the same first solution
+    mirrors = ('dict', 'bitmask', 'trail', 'queue')
+
+    def test_engines_agree(self):
+        for grid in self.grids:
+            expected = solution.solve(grid)
+            for engine in self.mirrors:
+                self.assertEqual(solution.solve(grid, engine), expected, "%s engine differs on %s" % (engine, grid))
+
+    def test_dlx_engine(self):
+        for grid in self.grids:
+            expected = solution.solve(grid)
+            values = solution.solve(grid, 'dlx')
+            if expected is False:
+                self.assertIs(values, False)
+                continue
+            for unit in solution.unitlist:
+                self.assertEqual(sorted(values[box] for box in unit), list('123456789'))
+            for box, char in zip(solution.boxes, grid):
+                if char != '.':
+                    self.assertEqual(values[box], char)
+        self.assertEqual(solution.solve(TestDiagonalSudoku.diagonal_grid, 'dlx'), TestDiagonalSudoku.solved_diag_sudoku)
+
+    def test_dlx_count(self):
+        self.assertEqual(dlx.count_solutions(solution.grid_values(TestDiagonalSudoku.diagonal_grid)), 1)
+        self.assertEqual(dlx.count_solutions(solution.grid_values(self.grids[3]), limit=5), 5)
+        self.assertEqual(dlx.count_solutions(solution.grid_values(self.grids[5])), 0)
+        # 4x4 plain sudoku has 288 solutions, 48 of them also valid on the diagonals
+        self.assertEqual(dlx.count_solutions(solution.grid_values('.' * 16, solution.get_topology(4, False)),
+                                             topology=solution.get_topology(4, False)), 288)
+
+    def test_bitmask_naked_twins(self):
+        for before, possible in ((TestNakedTwins.before_naked_twins_1, TestNakedTwins.possible_solutions_1),
+                                 (TestNakedTwins.before_naked_twins_2, TestNakedTwins.possible_solutions_2)):
+            after = bitmask.to_values(bitmask.naked_twins(bitmask.from_values(before)))
+            self.assertTrue(after in possible)
+
+    def test_trail_search_counters(self):
+        searcher = bitmask.TrailSearch(bitmask.from_values(solution.grid_values(self.grids[3])))
+        self.assertTrue(searcher.search())
+        stats = searcher.stats()
+        self.assertGreater(stats['nodes'], 1)
+        self.assertLess(stats['backtracks'], stats['nodes'])
+        self.assertGreaterEqual(stats['peak_trail'], len(searcher.trail))
+
+    def test_trail_undo_restores_board(self):
+        cands = bitmask.from_values(solution.grid_values(self.grids[0]))
+        searcher = bitmask.TrailSearch(cands[:])
+        bitmask.reduce_puzzle(searcher.cands, searcher.trail)
+        self.assertNotEqual(searcher.cands, cands)
+        searcher.undo(0)
+        self.assertEqual(searcher.cands, cands)
+
+    def test_propagate_reaches_fixed_point(self):
+        # propagate() must stop where sweeping the dict strategies until nothing changes stops
+        for grid in self.grids[:4]:
+            values = solution.grid_values(grid)
+            before = None
+            while values != before:
+                before = values.copy()
+                values = solution.only_choice(solution.naked_twins(solution.eliminate(values)))
+            cands = bitmask.propagate(bitmask.from_values(solution.grid_values(grid)))
+            self.assertEqual(bitmask.to_values(cands), values)
+
+    def test_propagate_stops_on_empty_box(self):
+        cands = bitmask.from_values(solution.grid_values(self.grids[5]))
+        self.assertIs(bitmask.propagate(cands), False)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            solution.solve(TestDiagonalSudoku.diagonal_grid, 'nope')
+
+class TestSolveMany(unittest.TestCase):
+    grids = TestEngines.grids + ['not a grid']
+
+    def check_results(self, results):
+        self.assertEqual(sorted(r.index for r in results), list(range(len(self.grids))))
+        for r in results:
+            self.assertEqual(r.grid, self.grids[r.index])
+            if r.index == len(self.grids) - 1:
+                self.assertIsNone(r.values)
+                self.assertTrue(r.error.startswith('AssertionError'))
+            else:
+                self.assertIsNone(r.error)
+                self.assertEqual(r.values, solution.solve(r.grid))
+
+    def test_in_process(self):
+        results = list(batch.solve_many(self.grids, workers=1, chunksize=2))
+        self.assertEqual([r.index for r in results], list(range(len(self.grids))))
+        self.check_results(results)
+
+    def test_init_worker(self):
+        topology = solution.get_topology(4, False)
+        bitmask._tables.pop(topology, None)
+        batch._init_worker(topology)
+        self.assertIn(topology, bitmask._tables)
+
+    def test_pool_ordered(self):
+        results = list(batch.solve_many(iter(self.grids), workers=2, chunksize=2, engine='queue'))
+        self.assertEqual([r.index for r in results], list(range(len(self.grids))))
+        self.check_results(results)
+
+    def test_pool_unordered(self):
+        self.check_results(list(batch.solve_many(self.grids, workers=2, chunksize=1, ordered=False)))
+
+
+class TestCli(unittest.TestCase):
+    def test_gzip_round_trip(self):
+        directory = tempfile.mkdtemp()
+        source = os.path.join(directory, 'puzzles.txt.gz')
+        target = os.path.join(directory, 'solutions.txt.gz')
+        with gzip.open(source, 'wt') as f:
+            f.write(TestDiagonalSudoku.diagonal_grid + '\n\nnot a grid\n' + TestEngines.grids[5] + '\n')
+        self.assertEqual(cli.main([source, '-o', target, '-q']), 0)
+        with gzip.open(target, 'rt') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines, [solution.grid_string(TestDiagonalSudoku.solved_diag_sudoku), cli.INVALID,
+                                 cli.UNSOLVABLE])
+
+    def test_closed_pipe(self):
+        directory = tempfile.mkdtemp()
+        source = os.path.join(directory, 'puzzles.txt')
+        with open(source, 'w') as f:
+            f.write((TestDiagonalSudoku.diagonal_grid + '\n') * 2000)
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+        process = subprocess.Popen([sys.executable, script, source, '--engine', 'queue', '-q'],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        process.stdout.readline()
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        self.assertEqual(process.wait(), 1)
+        self.assertNotIn(b'Traceback', stderr)
+
+
+class TestTrace(unittest.TestCase):
+    class SnapshotTrace(solution.Trace):
+        # also keeps the full snapshots the old global assignments list used to hold
+        def __init__(self, maxlen):
+            solution.Trace.__init__(self, maxlen)
+            self.snapshots = []
+
+        def record(self, values):
+            solution.Trace.record(self, values)
+            if not self.snapshots or self.snapshots[-1] != values:
+                self.snapshots.append(values.copy())
+
+    def test_frames_rebuild_snapshots(self):
+        trace = self.SnapshotTrace(None)
+        solution.solve(TestEngines.grids[3], trace=trace)
+        self.assertEqual(trace.dropped, 0)
+        self.assertEqual(list(trace.frames()), trace.snapshots[1:])
+
+    def test_bounded(self):
+        trace = self.SnapshotTrace(5)
+        solution.solve(TestEngines.grids[3], trace=trace)
+        self.assertEqual(len(trace), 5)
+        self.assertGreater(trace.dropped, 0)
+        self.assertEqual(list(trace.frames()), trace.snapshots[-5:])
+
+    def test_only_records_inside_solve(self):
+        trace = solution.Trace()
+        solution.solve(TestEngines.grids[3], trace=trace)
+        recorded = len(trace)
+        solution.solve(TestEngines.grids[2])
+        solution.assign_value(solution.grid_values(TestEngines.grids[2]), 'A1', '2')
+        self.assertEqual(len(trace), recorded)
+
+
+@unittest.skipIf(vectorized is None, 'numpy is not installed')
+class TestVectorized(unittest.TestCase):
+    def test_solve_batch_matches_solve(self):
+        results = vectorized.solve_batch(TestEngines.grids)
+        self.assertEqual(results, [solution.solve(grid) for grid in TestEngines.grids])
+
+    def test_propagation_alone_solves_easy_grids(self):
+        solved = solution.grid_string(TestDiagonalSudoku.solved_diag_sudoku)
+        easy = [solved, '.' + solved[1:], solved[:40] + '.' * 5 + solved[45:]]
+        cands, status = vectorized.propagate(vectorized.to_array(easy))
+        self.assertEqual(status.tolist(), [vectorized.SOLVED] * 3)
+        self.assertEqual((cands == vectorized.to_array([solved])).all(), True)
+
+    def test_failed_grid(self):
+        cands, status = vectorized.propagate(vectorized.to_array([TestEngines.grids[5]]))
+        self.assertEqual(status.tolist(), [vectorized.FAILED])
+
+    def test_malformed_grids(self):
+        grid = TestDiagonalSudoku.diagonal_grid
+        bad = ['x' * 81, grid[:-1], grid.replace('.', '0')]
+        results = vectorized.solve_batch(bad[:1] + [grid] + bad[1:])
+        self.assertEqual(results, [None, solution.solve(grid), None, None])
+        for g in bad:
+            with self.assertRaises(AssertionError):
+                solution.solve(g)
+            with self.assertRaises(ValueError):
+                vectorized.to_array([g])
+        # separators that utils.grid_values() skips are still read
+        self.assertEqual(vectorized.solve_batch([' '.join(grid)]), [solution.solve(grid)])
+
+
+class TestTopology(unittest.TestCase):
+    def check_solution(self, values, grid, topology):
+        for unit in topology.unitlist:
+            self.assertEqual(sorted(values[box] for box in unit), sorted(topology.digits))
+        for box, char in zip(topology.boxes, grid):
+            if char != '.':
+                self.assertEqual(values[box], char)
+
+    def test_default_topology(self):
+        topology = solution.get_topology()
+        self.assertIs(topology, solution.default_topology)
+        self.assertEqual(topology.boxes, solution.boxes)
+        self.assertEqual(topology.unitlist, solution.unitlist)
+        self.assertEqual(len(topology.unitlist), 29)
+        self.assertEqual(len(solution.get_topology(9, False).unitlist), 27)
+
+    def test_cached(self):
+        topology = solution.get_topology(16, False)
+        self.assertIs(solution.get_topology(16, False), topology)
+        self.assertIs(pickle.loads(pickle.dumps(topology)), topology)
+        self.assertIs(bitmask.get_tables(topology), bitmask.get_tables(topology))
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            solution.get_topology(10)
+
+    def test_plain_and_diagonal(self):
+        grid = TestEngines.grids[4]
+        plain = solution.get_topology(9, False)
+        self.assertIs(solution.solve(grid), False)
+        for engine in solution.ENGINES:
+            self.check_solution(solution.solve(grid, engine, topology=plain), grid, plain)
+
+    def test_larger_boards(self):
+        for n, diagonal, engines in ((4, True, solution.ENGINES), (16, False, solution.ENGINES),
+                                     (16, True, ['queue']), (25, False, ['queue'])):
+            topology = solution.get_topology(n, diagonal)
+            full = solution.grid_string(solution.solve('.' * n * n, 'queue', topology=topology), topology)
+            self.check_solution(solution.grid_values(full, topology), full, topology)
+            grid = ''.join(c if i % 3 else '.' for i, c in enumerate(full))
+            for engine in engines:
+                self.check_solution(solution.solve(grid, engine, topology=topology), grid, topology)
+
+    def test_solve_many_topology(self):
+        plain = solution.get_topology(9, False)
+        results = list(batch.solve_many([TestEngines.grids[4]] * 3, workers=2, chunksize=1, topology=plain))
+        for r in results:
+            self.check_solution(r.values, r.grid, plain)
+
+
+class TestSolveCache(unittest.TestCase):
+    grid = TestDiagonalSudoku.diagonal_grid
+
+    def variants(self):
+        for perm in cache.symmetries():
+            transformed = ''.join(self.grid[i] for i in perm)
+            yield transformed.translate(str.maketrans('123456789', '518293746'))
+
+    def test_symmetric_variants_hit(self):
+        solve_cache = cache.SolveCache()
+        self.assertEqual(solve_cache.solve(self.grid), TestDiagonalSudoku.solved_diag_sudoku)
+        for grid in self.variants():
+            self.assertEqual(solve_cache.solve(grid), solution.solve(grid))
+        stats = solve_cache.stats()
+        self.assertEqual((stats['misses'], stats['hits'], stats['size']), (1, len(cache.symmetries()), 1))
+
+    def test_plain_band_swaps_hit(self):
+        plain = solution.get_topology(9, False)
+        self.assertEqual(len(cache.symmetries(plain)), 288)
+        grid = TestEngines.grids[4]  # unique on the plain board too
+        rows = [grid[i:i + 9] for i in range(0, 81, 9)]
+        swapped = ''.join(rows[6:] + rows[3:6] + rows[:3])
+        swapped = ''.join(swapped[r * 9 + c] for r in range(9) for c in (3, 4, 5, 0, 1, 2, 6, 7, 8))
+        solve_cache = cache.SolveCache(topology=plain)
+        solve_cache.solve(grid)
+        self.assertEqual(solve_cache.solve(swapped), solution.solve(swapped, topology=plain))
+        self.assertEqual((solve_cache.misses, solve_cache.hits), (1, 1))
+
+    def test_diagonal_symmetries_only(self):
+        # a shift of the bands keeps rows, columns and squares but moves the diagonals
+        shifted = self.grid[27:] + self.grid[:27]
+        self.assertNotEqual(cache.canonical_form(shifted)[0], cache.canonical_form(self.grid)[0])
+
+    def test_unsolvable_and_eviction(self):
+        solve_cache = cache.SolveCache(maxsize=1)
+        self.assertIs(solve_cache.solve(TestEngines.grids[5]), False)
+        self.assertIs(solve_cache.solve(TestEngines.grids[5]), False)
+        solve_cache.solve(self.grid)
+        self.assertEqual(solve_cache.stats()['size'], 1)
+        self.assertIs(solve_cache.solve(TestEngines.grids[5]), False)
+        self.assertEqual((solve_cache.hits, solve_cache.misses), (1, 3))
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_corpora(self):
+        for name in benchmark.CORPORA:
+            grids, topology = benchmark.load_corpus(name)
+            self.assertTrue(grids)
+            solved = [solution.solve(grid, 'queue', topology=topology) is not False for grid in grids]
+            self.assertEqual(all(solved), name != 'unsolvable')
+            self.assertEqual(any(solved), name != 'unsolvable')
+
+    def test_run_and_compare(self):
+        report = benchmark.run_benchmark(['unsolvable'], engine='queue')
+        metrics = report['results']['unsolvable/solve']
+        self.assertEqual(metrics['count'], 10)
+        self.assertGreater(metrics['puzzles_per_sec'], 0)
+        self.assertGreater(metrics['nodes'], 0)
+        self.assertLessEqual(metrics['p50_ms'], metrics['p99_ms'])
+        self.assertEqual(benchmark.compare(report, report), [])
+
+        slower = json.loads(json.dumps(report))
+        slower['results']['unsolvable/solve']['puzzles_per_sec'] /= 2
+        slower['results']['unsolvable/solve']['nodes'] *= 2
+        regressions = benchmark.compare(slower, report, 0.10)
+        self.assertEqual(len(regressions), 2)
+        self.assertEqual(benchmark.compare(report, slower, 0.10), [])
+
+    def test_branching_needs_dict_engine(self):
+        with self.assertRaises(ValueError):
+            benchmark.run_benchmark(['unsolvable'], engine='queue', policy='lcv')
+        with self.assertRaises(SystemExit):
+            benchmark.main(['--engine', 'queue', '--branching', 'lcv'])
+
+
+class TestBranching(unittest.TestCase):
+    def test_policies_agree(self):
+        grids, topology = benchmark.load_corpus('hard')
+        grids = grids[:3]
+        expected = [solution.solve(grid, topology=topology) for grid in grids]
+        nodes = {}
+        for name in branching.POLICIES:
+            policy = branching.get_policy(name)
+            self.assertEqual([solution.solve(grid, topology=topology, branching=policy) for grid in grids], expected)
+            self.assertGreater(policy.nodes, len(grids))
+            self.assertLess(policy.failures, policy.nodes)
+            nodes[name] = policy.stats()['nodes']
+        self.assertEqual(nodes['first'], benchmark.count_nodes(grids, topology, 'trail'))
+
+    def test_lcv_order(self):
+        values = solution.grid_values('.' * 81)
+        values.update({'A1': '123', 'A2': '1', 'B1': '2'})
+        self.assertEqual(branching.get_policy('lcv').order(values, 'A1', solution.default_topology), '312')
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            solution.solve(TestDiagonalSudoku.diagonal_grid, branching='random')
+        with self.assertRaises(ValueError):
+            solution.solve(TestDiagonalSudoku.diagonal_grid, 'queue', branching='lcv')
+        with self.assertRaises(ValueError):
+            solution.search(solution.grid_values(TestDiagonalSudoku.diagonal_grid), 'bitmask', naked=4)
+
+
+class TestCountSolutions(unittest.TestCase):
+    def test_unique(self):
+        self.assertEqual(solution.count_solutions(TestDiagonalSudoku.diagonal_grid), 1)
+        grids, topology = benchmark.load_corpus('hard')
+        self.assertEqual([solution.count_solutions(grid, topology=topology) for grid in grids[:3]], [1, 1, 1])
+
+    def test_limit(self):
+        self.assertEqual(solution.count_solutions(TestEngines.grids[2]), 2)
+        self.assertEqual(solution.count_solutions(TestEngines.grids[2], limit=None), 6)
+        self.assertEqual(solution.count_solutions(TestEngines.grids[3], limit=None), 5)
+        self.assertEqual(solution.count_solutions(TestEngines.grids[5]), 0)
+        self.assertEqual(solution.count_solutions('.' * 16, None, solution.get_topology(4, False)), 288)
+
+    def test_parallel(self):
+        for grid in TestEngines.grids:
+            self.assertEqual(solution.count_solutions(grid, limit=10, workers=2),
+                             dlx.count_solutions(solution.grid_values(grid), limit=10))
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            for grid in TestEngines.grids:
+                self.assertEqual(solution.count_solutions(grid, limit=10, executor=pool),
+                                 solution.count_solutions(grid, limit=10))
+
+    def test_stop(self):
+        # counting every solution of the empty board would never finish; the stop function ends it
+        matrix = dlx.build(solution.grid_values('.' * 81))
+        self.assertLess(len(matrix.solve(None, stop=lambda: True)), dlx.STOP_INTERVAL)
+        self.assertEqual(matrix.nodes, dlx.STOP_INTERVAL)
+
+
+class TestStrategies(unittest.TestCase):
+    topology = solution.get_topology(9, False)
+
+    def empty(self, digit, keep, unit):
+        values = solution.grid_values('.' * 81, self.topology)
+        for box in unit:
+            if box not in keep:
+                values[box] = values[box].replace(digit, '')
+        return values
+
+    def test_hidden_pairs(self):
+        row = self.topology.row_units[0]
+        values = self.empty('1', ('A1', 'A2'), row)
+        for box in row[2:]:
+            values[box] = values[box].replace('2', '')
+        values = solution.hidden_pairs(values, [row], self.topology)
+        self.assertEqual((values['A1'], values['A2'], values['A3']), ('12', '12', '3456789'))
+
+    def test_locked_candidates(self):
+        square = self.topology.square_units[0]
+        values = solution.pointing_pairs(self.empty('1', ('A1', 'A2'), square), self.topology)
+        self.assertEqual([box for box in self.topology.row_units[0] if '1' in values[box]], ['A1', 'A2'])
+        self.assertIn('1', values['D1'])
+
+        values = solution.box_line_reduction(self.empty('1', ('A1', 'A2'), self.topology.row_units[0]), self.topology)
+        self.assertEqual([box for box in square if '1' in values[box]], ['A1', 'A2'])
+        self.assertIn('1', values['B4'])
+
+    def test_adaptive_pipeline(self):
+        grids, topology = benchmark.load_corpus('hard')
+        everything = sorted(solution.STRATEGIES)
+        default_nodes = benchmark.count_nodes(grids, topology, 'dict')
+        nodes = 0
+        profiler = solution.Profiler()
+        for grid in grids:
+            driver = solution.SearchDriver(solution.grid_values(grid, topology), topology=topology,
+                                           strategies=everything)
+            with solution.profiling(profiler):
+                self.assertEqual(driver.run(), solution.solve(grid, topology=topology))
+            nodes += driver.nodes
+        self.assertLess(nodes, default_nodes)
+        calls = profiler.stats()['strategies']
+        self.assertGreater(calls['eliminate']['calls'], calls['naked_twins']['calls'])
+        self.assertGreater(calls['naked_twins']['calls'], calls['naked_quads']['calls'])
+        self.assertEqual(solution.reduce_puzzle(solution.grid_values(TestEngines.grids[5]), strategies=everything),
+                         False)
+
+    def test_eliminate_required(self):
+        for strategies in (['naked_twins'], ['only_choice'], ['hidden_pairs', 'pointing_pairs'], []):
+            with self.assertRaises(ValueError):
+                solution.solve(TestDiagonalSudoku.diagonal_grid, strategies=strategies)
+        # a full board that breaks the rules is not taken for solved
+        self.assertIs(solution.reduce_puzzle(solution.grid_values('1' * 81), strategies=['eliminate']), False)
+        solved = solution.solve(TestDiagonalSudoku.diagonal_grid)
+        self.assertTrue(solution._consistent(solved, solution.default_topology))
+        solved['A1'], solved['A2'] = solved['A2'], solved['A2']
+        self.assertFalse(solution._consistent(solved, solution.default_topology))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            solution.solve(TestDiagonalSudoku.diagonal_grid, strategies=['x_wing'])
+        with self.assertRaises(ValueError):
+            solution.solve(TestDiagonalSudoku.diagonal_grid, 'queue', strategies=['eliminate'])
+
+
+class TestGenerator(unittest.TestCase):
+    def test_generate(self):
+        puzzle = generator.generate(clues=30, difficulty='easy', rng=random.Random(1))
+        self.assertEqual((puzzle.clues, puzzle.difficulty), (30, 'easy'))
+        self.assertEqual(81 - puzzle.grid.count('.'), 30)
+        self.assertTrue(generator.is_unique(puzzle.grid))
+        self.assertEqual(solution.grid_string(solution.solve(puzzle.grid)), puzzle.solution)
+        self.assertTrue(all(a == '.' or a == b for a, b in zip(puzzle.grid, puzzle.solution)))
+
+        hard = generator.generate(difficulty='hard', rng=random.Random(2))
+        self.assertTrue(generator.is_unique(hard.grid))
+        self.assertEqual(generator.rate(hard.grid), 'hard')
+
+    def test_seeds_and_workers(self):
+        topology = solution.get_topology(4, True)
+        puzzles = list(generator.generate_many(12, seed=5, workers=1, chunksize=5, topology=topology))
+        self.assertEqual(len(puzzles), 12)
+        self.assertEqual(list(generator.generate_many(12, seed=5, workers=2, chunksize=5, topology=topology)), puzzles)
+        self.assertNotEqual(list(generator.generate_many(12, seed=6, workers=1, topology=topology)), puzzles)
+        for puzzle in puzzles:
+            self.assertTrue(generator.is_unique(puzzle.grid, topology))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            generator.generate(difficulty='fiendish')
+        with self.assertRaises(RuntimeError):
+            generator.generate(clues=5, rng=random.Random(0), attempts=1)
+
+
+class TestSearchDriver(unittest.TestCase):
+    def test_budget_and_resume(self):
+        grids, topology = benchmark.load_corpus('hard')
+        for grid in grids[:3]:
+            values = solution.grid_values(grid, topology)
+            expected = solution.search(dict(values), topology=topology)
+            whole = solution.SearchDriver(dict(values), topology=topology)
+            self.assertEqual(whole.run(), expected)
+            self.assertEqual(whole.nodes, benchmark.count_nodes([grid], topology, 'trail'))
+
+            driver = solution.SearchDriver(dict(values), topology=topology)
+            runs = 0
+            while driver.run(max_nodes=1) is None:
+                self.assertFalse(driver.done)
+                runs += 1
+            self.assertEqual(driver.result, expected)
+            self.assertEqual(driver.nodes, whole.nodes)
+            self.assertEqual(runs, whole.nodes - 1)
+
+    def test_save_and_restore(self):
+        grid = benchmark.load_corpus('hard')[0][1]
+        topology = solution.get_topology(9, False)
+        driver = solution.SearchDriver(solution.grid_values(grid, topology), topology=topology, branching='mrv-degree')
+        self.assertIsNone(driver.run(max_nodes=5))
+        self.assertGreater(driver.peak_depth, 0)
+        restored = solution.SearchDriver.restore(json.loads(json.dumps(driver.save())))
+        self.assertEqual(restored.run(), solution.solve(grid, topology=topology, branching='mrv-degree'))
+        self.assertEqual(restored.policy.name, 'mrv-degree')
+        self.assertIs(solution.SearchDriver(solution.grid_values(TestEngines.grids[5])).run(), False)
+        with self.assertRaises(solution.SolveTimeout):
+            solution.SearchDriver(solution.grid_values(grid, topology), topology=topology).run(deadline=0)
+
+
+class TestProfiler(unittest.TestCase):
+    def test_reduce_counters(self):
+        grids, topology = benchmark.load_corpus('easy')
+        values = solution.grid_values(grids[0], topology)
+        before = sum(len(v) for v in values.values())
+        events = []
+        profiler = solution.Profiler(lambda event, data: events.append(event))
+        with solution.profiling(profiler):
+            reduced = solution.reduce_puzzle(values, 3, topology)
+        self.assertIsNone(solution.active_profiler())
+        stats = profiler.stats()
+        self.assertEqual(sum(c['removed'] for c in stats['strategies'].values()),
+                         before - sum(len(v) for v in reduced.values()))
+        self.assertEqual(sorted(stats['strategies']), ['eliminate', 'naked_triples', 'naked_twins', 'only_choice'])
+        self.assertEqual(stats['reductions'], 1)
+        self.assertEqual(events.count('sweep'), stats['sweeps'])
+        self.assertEqual(events.count('strategy'), 4 * stats['sweeps'])
+
+    def test_search_depths_and_prometheus(self):
+        grid = benchmark.load_corpus('hard')[0][0]
+        topology = solution.get_topology(9, False)
+        driver = solution.SearchDriver(solution.grid_values(grid, topology), topology=topology)
+        profiler = solution.Profiler()
+        with solution.profiling(profiler):
+            driver.run()
+        stats = profiler.stats()
+        self.assertEqual(stats['nodes'], driver.nodes)
+        self.assertEqual(sum(c['nodes'] for c in stats['depths'].values()), driver.nodes)
+        self.assertEqual(max(stats['depths']), driver.peak_depth)
+        self.assertEqual(sum(c['removed'] for c in stats['depths'].values()),
+                         sum(c['removed'] for c in stats['strategies'].values()))
+        text = profiler.prometheus()
+        self.assertIn('sudoku_nodes_total %d\n' % driver.nodes, text)
+        self.assertIn('# TYPE sudoku_strategy_removed_total counter', text)
+        self.assertIn('sudoku_depth_nodes_total{depth="0"} 1\n', text)
+
+
+@unittest.skipIf(PySudoku is None, 'pygame is not installed')
+class TestRendering(unittest.TestCase):
+    def test_incremental_frames(self):
+        import pygame
+        trace = solution.Trace()
+        solution.solve(TestDiagonalSudoku.diagonal_grid, trace=trace)
+        boards = list(trace.frames())[-12:]
+        directory = tempfile.mkdtemp()
+        self.assertEqual(PySudoku.play(boards, headless=True, frame_dir=directory, frame_format='bmp'), 12)
+        self.assertEqual(len(os.listdir(directory)), 12)
+        self.assertNotEqual(os.environ.get('SDL_VIDEODRIVER'), 'dummy')
+
+        # the last incrementally drawn frame matches a full redraw of the last board
+        last = tempfile.mkdtemp()
+        PySudoku.play(boards[-1:], headless=True, frame_dir=last, frame_format='bmp')
+        pygame.init()
+        try:
+            incremental = pygame.image.load(os.path.join(directory, 'frame00011.bmp'))
+            full = pygame.image.load(os.path.join(last, 'frame00000.bmp'))
+            self.assertEqual(pygame.image.tostring(incremental, 'RGB'), pygame.image.tostring(full, 'RGB'))
+        finally:
+            pygame.quit()
+
+
+class TestService(unittest.TestCase):
+    def test_deadline(self):
+        for engine in sorted(solution.ENGINES):
+            with self.assertRaises(solution.SolveTimeout):
+                solution.solve(TestEngines.grids[0], engine, deadline=time.monotonic() - 1)
+        self.assertTrue(solution.solve(TestEngines.grids[0], deadline=time.monotonic() + 60))
+
+    def test_local_client(self):
+        grids, topology = benchmark.load_corpus('easy')
+
+        async def run():
+            async with service.SolverService(max_concurrency=2, timeout=60, topology=topology) as solver:
+                responses = await service.LocalClient(solver).solve_many(grids[:6] + ['1' * 81, 'x'])
+                return responses, solver.stats()
+
+        responses, stats = asyncio.run(run())
+        self.assertEqual([r['solution'] for r in responses[:6]],
+                         [solution.grid_string(solution.solve(grid, topology=topology), topology) for grid in grids[:6]])
+        self.assertEqual([r['status'] for r in responses[6:]], ['unsolvable', 'invalid'])
+        self.assertEqual((stats['solved'], stats['unsolvable'], stats['errors'], stats['running']), (6, 1, 1, 0))
+
+    def test_timeout_and_backpressure(self):
+        grid = benchmark.load_corpus('hard')[0][0]
+
+        async def run():
+            async with service.SolverService(max_concurrency=1, max_queue=1, timeout=0.001) as solver:
+                return await service.LocalClient(solver).solve_many([grid] * 4)
+
+        statuses = [r['status'] for r in asyncio.run(run())]
+        self.assertEqual(statuses, ['timeout', 'timeout', 'busy', 'busy'])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,65 +1,334 @@
-assignments = []
+from collections import deque
+from contextlib import contextmanager
+import threading
+import time
+
+# the Trace recording the current solve, per thread. None when tracing is off.
+_active = threading.local()
 
 
 def cross(A, B):
     "Cross product of elements in A and elements in B."
     return [s+t for s in A for t in B]
 
-rows = 'ABCDEFGHI'
-cols = '123456789'
+class Topology(object):
+    """
+    Boxes, units and peers of an n x n board, where n is a square number (4, 9, 16 or 25).
+    With diagonal=True the two main diagonals are units as well, as in diagonal sudoku.
+    Use get_topology() instead of building one directly, so every topology is only built once.
+    """
+    symbols = '123456789ABCDEFGHIJKLMNOP'
+    row_names = 'ABCDEFGHIJKLMNOPQRSTUVWXY'
+
+    def __init__(self, n=9, diagonal=True):
+        size = int(round(n ** 0.5))
+        if size * size != n or not 1 < n <= len(self.symbols):
+            raise ValueError('Board side must be a square number between 4 and %d, got %r' % (len(self.symbols), n))
+        self.n = n
+        self.size = size
+        self.diagonal = diagonal
+        self.digits = self.symbols[:n]
+        self.rows = self.row_names[:n]
+        self.cols = [str(c) for c in range(1, n + 1)]
+        self.boxes = cross(self.rows, self.cols)
+
+        bands = [self.rows[i:i + size] for i in range(0, n, size)]
+        stacks = [self.cols[i:i + size] for i in range(0, n, size)]
+        self.row_units = [cross(r, self.cols) for r in self.rows]
+        self.column_units = [cross(self.rows, [c]) for c in self.cols]
+        self.square_units = [cross(rs, cs) for rs in bands for cs in stacks]
+        if diagonal:
+            self.diagonal_units = [[r+c for r, c in zip(self.rows, self.cols)],
+                                   [r+c for r, c in zip(reversed(self.rows), self.cols)]]
+        else:
+            self.diagonal_units = []
+        self.unitlist = self.row_units + self.column_units + self.square_units + self.diagonal_units
+        self.units = dict((s, [u for u in self.unitlist if s in u]) for s in self.boxes)
+        self.peers = dict((s, set(sum(self.units[s], []))-set([s])) for s in self.boxes)
+
+    def __reduce__(self):
+        # unpickling (e.g. in a worker process) goes through the cache of that process
+        return get_topology, (self.n, self.diagonal)
+
+    def __repr__(self):
+        return 'get_topology(%d, diagonal=%r)' % (self.n, self.diagonal)
+
+
+_topologies = {}
+
+
+def get_topology(n=9, diagonal=True):
+    """
+    Return the Topology of an n x n board, building it on the first request only.
+    Input: The side of the board (4, 9, 16 or 25) and whether the diagonals are units.
+    Output: The cached Topology.
+    """
+    key = (n, bool(diagonal))
+    topology = _topologies.get(key)
+    if topology is None:
+        topology = _topologies[key] = Topology(n, diagonal)
+    return topology
+
+
+# the board solved by default: 9x9 diagonal sudoku
+default_topology = get_topology(9, True)
+
+rows = default_topology.rows
+cols = ''.join(default_topology.cols)
+
+boxes = default_topology.boxes
+
+row_units = default_topology.row_units
+column_units = default_topology.column_units
+square_units = default_topology.square_units
+main_diagonal_unit, second_diagonal_unit = default_topology.diagonal_units
+diagonales = default_topology.diagonal_units
+unitlist = default_topology.unitlist
+units = default_topology.units
+peers = default_topology.peers
+
+
+class SolveTimeout(Exception):
+    """Raised by the solvers when a solve runs past its deadline."""
+
+
+def check_deadline(deadline):
+    """
+    Raise SolveTimeout if deadline (a time.monotonic() value) has passed. Does nothing if deadline is None.
+    The solvers call this once per search node and per reduction sweep, so a solve stops soon after its deadline.
+    """
+    if deadline is not None and time.monotonic() > deadline:
+        raise SolveTimeout('Solve did not finish before its deadline')
+
+
+class Trace(object):
+    """
+    Bounded recorder of the assignments made during a solve.
+
+    Every recorded board is stored as a compact diff against the previous one: a tuple of
+    (box, old, new) triples. Only the last maxlen diffs are kept; older ones are folded into the
+    base board, so frames() can always rebuild full boards from the diffs that are left.
+    """
 
-boxes = cross(rows, cols)
+    def __init__(self, maxlen=10000):
+        self.base = None
+        self.diffs = deque()
+        self.maxlen = maxlen
+        self.dropped = 0
+        self._board = None
 
-row_units = [cross(r, cols) for r in rows]
-column_units = [cross(rows, c) for c in cols]
-square_units = [cross(rs, cs) for rs in ('ABC', 'DEF', 'GHI') for cs in ('123', '456', '789')]
-main_diagonal_unit = [r+c for r, c in zip(rows, cols)]
-second_diagonal_unit = [r+c for r, c in zip(reversed(rows), cols)]
-diagonales = [main_diagonal_unit, second_diagonal_unit]
-unitlist = row_units + column_units + square_units + diagonales
-units = dict((s, [u for u in unitlist if s in u]) for s in boxes)
-peers = dict((s, set(sum(units[s], []))-set([s])) for s in boxes)
+    def record(self, values):
+        """Record the current board if it differs from the last recorded one."""
+        if self._board is None:
+            self.base = values.copy()
+            self._board = values.copy()
+            return
+        board = self._board
+        diff = tuple((box, board[box], values[box]) for box in values if values[box] != board[box])
+        if not diff:
+            return
+        for box, old, new in diff:
+            board[box] = new
+        self.diffs.append(diff)
+        if self.maxlen is not None and len(self.diffs) > self.maxlen:
+            for box, old, new in self.diffs.popleft():
+                self.base[box] = new
+            self.dropped += 1
+
+    def frames(self):
+        """Yield the full board after every recorded diff, in dictionary form."""
+        if self.base is None:
+            return
+        board = self.base.copy()
+        for diff in self.diffs:
+            for box, old, new in diff:
+                board[box] = new
+            yield board.copy()
+
+    def __len__(self):
+        return len(self.diffs)
+
+
+@contextmanager
+def recording(trace):
+    """Record every assign_value() of the current thread on trace while the block runs."""
+    previous = getattr(_active, 'trace', None)
+    _active.trace = trace
+    try:
+        yield trace
+    finally:
+        _active.trace = previous
+
+
+class Profiler(object):
+    """
+    Counters and timers of the dict engine's propagation, per strategy and per search depth.
+
+    Collects while profiling() is active on the current thread. With a callback, every event is also
+    passed on as callback(event, data): 'node' when search() visits a node, 'sweep' for every
+    iteration of reduce_puzzle() and 'strategy' after every strategy call.
+
+    Counters:
+        strategies: strategy name -> {'calls', 'removed' (candidates), 'seconds'}.
+        depths: search depth -> {'nodes', 'removed', 'seconds'}.
+        nodes: number of search nodes visited.
+        reductions: number of reduce_puzzle() calls.
+        sweeps: number of reduce_puzzle() iterations.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.depth = 0
+        self.strategies = {}
+        self.depths = {}
+        self.nodes = 0
+        self.reductions = 0
+        self.sweeps = 0
+
+    def _depth_counters(self):
+        counters = self.depths.get(self.depth)
+        if counters is None:
+            counters = self.depths[self.depth] = {'nodes': 0, 'removed': 0, 'seconds': 0.0}
+        return counters
+
+    def node(self, depth):
+        """Called by search() before it reduces a node at the given depth."""
+        self.depth = depth
+        self.nodes += 1
+        self._depth_counters()['nodes'] += 1
+        if self.callback is not None:
+            self.callback('node', {'depth': depth})
+
+    def reduction(self):
+        """Called at the start of every reduce_puzzle()."""
+        self.reductions += 1
+
+    def sweep(self, iteration):
+        """Called at the start of every iteration of reduce_puzzle(), counted from 1."""
+        self.sweeps += 1
+        if self.callback is not None:
+            self.callback('sweep', {'depth': self.depth, 'iteration': iteration})
+
+    def strategy(self, name, removed, seconds):
+        """Called after a strategy removed candidates from the board in the given time."""
+        counters = self.strategies.get(name)
+        if counters is None:
+            counters = self.strategies[name] = {'calls': 0, 'removed': 0, 'seconds': 0.0}
+        counters['calls'] += 1
+        counters['removed'] += removed
+        counters['seconds'] += seconds
+        counters = self._depth_counters()
+        counters['removed'] += removed
+        counters['seconds'] += seconds
+        if self.callback is not None:
+            self.callback('strategy', {'name': name, 'depth': self.depth, 'removed': removed, 'seconds': seconds})
+
+    def stats(self):
+        """Return the counters as a dictionary."""
+        return {
+            'nodes': self.nodes,
+            'reductions': self.reductions,
+            'sweeps': self.sweeps,
+            'strategies': dict((name, dict(c)) for name, c in self.strategies.items()),
+            'depths': dict((depth, dict(c)) for depth, c in self.depths.items()),
+        }
+
+    def prometheus(self, prefix='sudoku'):
+        """Return the counters in the Prometheus text exposition format."""
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s counter' % (prefix, name))
+            for labels, value in samples:
+                lines.append('%s_%s%s %s' % (prefix, name, labels, repr(value)))
+
+        metric('nodes_total', 'Search nodes visited.', [('', self.nodes)])
+        metric('reductions_total', 'reduce_puzzle() calls.', [('', self.reductions)])
+        metric('sweeps_total', 'reduce_puzzle() iterations.', [('', self.sweeps)])
+        strategies = sorted(self.strategies.items())
+        for key, help_text in (('calls', 'Strategy calls.'), ('removed', 'Candidates removed by a strategy.'),
+                               ('seconds', 'Time spent in a strategy.')):
+            metric('strategy_%s_total' % key, help_text,
+                   [('{strategy="%s"}' % name, c[key]) for name, c in strategies])
+        depths = sorted(self.depths.items())
+        for key, help_text in (('nodes', 'Search nodes visited at a depth.'),
+                               ('removed', 'Candidates removed at a depth.'),
+                               ('seconds', 'Time spent in the strategies at a depth.')):
+            metric('depth_%s_total' % key, help_text, [('{depth="%d"}' % depth, c[key]) for depth, c in depths])
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def profiling(profiler):
+    """Collect the propagation counters of the current thread on profiler while the block runs."""
+    previous = getattr(_active, 'profiler', None)
+    _active.profiler = profiler
+    try:
+        yield profiler
+    finally:
+        _active.profiler = previous
+
+
+def active_profiler():
+    """Return the Profiler collecting on the current thread, or None."""
+    return getattr(_active, 'profiler', None)
 
 
 def assign_value(values, box, value):
     """
     Please use this function to update your values dictionary!
-    Assigns a value to a given box. If it updates the board record it.
+    Assigns a value to a given box. If it updates the board and a Trace is recording, record it.
     """
     values[box] = value
     if len(value) == 1:
-        assignments.append(values.copy())
+        trace = getattr(_active, 'trace', None)
+        if trace is not None:
+            trace.record(values)
     return values
 
 
-def display(values):
+def display(values, topology=None):
     """
     Display the values as a 2-D grid.
-    Input: The sudoku in dictionary form
+    Input: The sudoku in dictionary form, and its Topology (the default 9x9 board if None)
     Output: None
     """
-    width = 1+max(len(values[s]) for s in boxes)
-    line = '+'.join(['-'*(width*3)]*3)
-    for r in rows:
-        print(''.join(values[r+c].center(width)+('|' if c in '36' else '')
-                      for c in cols))
-        if r in 'CF': print(line)
+    topology = topology or default_topology
+    size = topology.size
+    width = 1+max(len(values[s]) for s in topology.boxes)
+    line = '+'.join(['-'*(width*size)]*size)
+    for i, r in enumerate(topology.rows):
+        print(''.join(values[r+c].center(width)+('|' if j % size == size - 1 and j < topology.n - 1 else '')
+                      for j, c in enumerate(topology.cols)))
+        if i % size == size - 1 and i < topology.n - 1: print(line)
     print
 
-def grid_values(grid):
+def grid_values(grid, topology=None):
     """
     Convert grid into a dict of {square: char} with '123456789' for empties.
-    Input: A grid in string form.
+    Input: A grid in string form, and its Topology (the default 9x9 board if None).
     Output: A grid in dictionary form
             Keys: The boxes, e.g., 'A1'
             Values: The value in each box, e.g., '8'. If the box has no value, then the value will be '123456789'.
     """
+    topology = topology or default_topology
     chars = []
-    digits = '123456789'
+    digits = topology.digits
     for c in grid:
         if c in digits:
             chars.append(c)
         if c == '.':
             chars.append(digits)
-    assert len(chars) == 81
-    return dict(zip(boxes, chars))
+    assert len(chars) == len(topology.boxes)
+    return dict(zip(topology.boxes, chars))
+
+
+def grid_string(values, topology=None):
+    """
+    Convert a grid in dictionary form back into a grid string.
+    Input: A grid in dictionary form, and its Topology (the default 9x9 board if None)
+    Output: A string with one character per box, with '.' for the boxes that have more than one value.
+    """
+    topology = topology or default_topology
+    return ''.join(values[box] if len(values[box]) == 1 else '.' for box in topology.boxes)
@@ -0,0 +1,152 @@
+"""
+Vectorized propagation of many puzzles at once with NumPy.
+
+N puzzles are held as an (N, 81) uint16 array of candidate masks, in the bit layout of bitmask.py. The
+eliminate and only choice passes of solution.py run as array operations over the unit and peer index
+tables, so one pass covers the whole batch. Puzzles that propagation alone cannot finish are handed to
+solution.search() one at a time.
+
+Requires numpy.
+"""
+import numpy as np
+
+import bitmask
+import solution
+from utils import grid_string, grid_values
+
+n_boxes = len(bitmask.box_index)
+full_mask = bitmask.full_mask
+
+# candidate mask of every byte of a normalized grid string: digits are single bits, '.' is every digit
+char_mask = np.zeros(256, dtype=np.uint16)
+for d, bit in zip(bitmask.digits, bitmask.digit_bits):
+    char_mask[ord(d)] = bit
+char_mask[ord('.')] = full_mask
+_grid_chars = frozenset(bitmask.digits + '.')
+
+bit_count = np.array(bitmask.bit_count, dtype=np.uint8)
+unit_table = np.array(bitmask.unit_indices, dtype=np.intp)
+
+# peers padded to the same length with index n_boxes, a column of zeros appended to the board
+_max_peers = max(len(p) for p in bitmask.peer_indices)
+peer_table = np.array([p + [n_boxes] * (_max_peers - len(p)) for p in bitmask.peer_indices], dtype=np.intp)
+
+SOLVED = 1
+UNSOLVED = 0
+FAILED = -1
+
+
+def normalize(grid):
+    """
+    Return a grid string as 81 digits and dots.
+    Input: A grid string in the format accepted by utils.grid_values().
+    Output: The grid string. Raises ValueError if utils.grid_values() rejects the grid.
+    """
+    if len(grid) == n_boxes and _grid_chars.issuperset(grid):
+        return grid
+    try:
+        return grid_string(grid_values(grid))
+    except AssertionError:
+        raise ValueError('Not a sudoku grid: %r' % (grid,))
+
+
+def to_array(grids):
+    """
+    Convert grid strings into an (N, 81) array of candidate masks.
+    Input: A list of grid strings in the format accepted by utils.grid_values().
+    Output: A uint16 array with one row per grid. Raises ValueError if any grid cannot be read.
+    """
+    grids = [normalize(g) for g in grids]
+    raw = np.frombuffer(''.join(grids).encode('ascii'), dtype=np.uint8).reshape(len(grids), n_boxes)
+    return char_mask[raw]
+
+
+def eliminate(cands):
+    """
+    Remove the value of every solved box from the candidates of its peers, for every puzzle.
+    Input: An (N, 81) array of candidate masks.
+    Output: The reduced array.
+    """
+    solved = np.where(bit_count[cands] == 1, cands, 0)
+    solved = np.concatenate([solved, np.zeros((len(cands), 1), dtype=cands.dtype)], axis=1)
+    taken = np.bitwise_or.reduce(solved[:, peer_table], axis=2)
+    return cands & ~taken
+
+
+def only_choice(cands):
+    """
+    Assign every digit that only fits in one box of a unit to that box, for every puzzle.
+    A box that is the only place of two different digits, or a unit missing a digit, is emptied,
+    which marks the puzzle as failed.
+    Input: An (N, 81) array of candidate masks.
+    Output: The reduced array.
+    """
+    units = cands[:, unit_table]
+    once = np.zeros(units.shape[:2], dtype=cands.dtype)
+    twice = np.zeros_like(once)
+    for k in range(unit_table.shape[1]):
+        m = units[:, :, k]
+        twice |= once & m
+        once |= m
+    singles = once & ~twice
+
+    hidden = np.zeros_like(cands)
+    for u, unit in enumerate(unit_table):
+        hidden[:, unit] |= units[:, u, :] & singles[:, u, None]
+    cands = np.where(hidden != 0, np.where(bit_count[hidden] == 1, hidden, 0), cands)
+
+    missing = (once != full_mask).any(axis=1)
+    cands[missing, 0] = 0
+    return cands
+
+
+def propagate(cands):
+    """
+    Repeat eliminate() and only_choice() over the whole batch until no puzzle changes.
+    Input: An (N, 81) array of candidate masks.
+    Output: The reduced array and an array of N statuses: SOLVED, UNSOLVED or FAILED.
+    """
+    active = np.ones(len(cands), dtype=bool)
+    while active.any():
+        before = cands[active]
+        after = only_choice(eliminate(before))
+        cands[active] = after
+        changed = (after != before).any(axis=1) & (after != 0).all(axis=1)
+        active[np.flatnonzero(active)[~changed]] = False
+
+    counts = bit_count[cands]
+    status = np.full(len(cands), UNSOLVED, dtype=np.int8)
+    status[(counts == 1).all(axis=1)] = SOLVED
+    status[(counts == 0).any(axis=1)] = FAILED
+    return cands, status
+
+
+def solve_batch(grids, engine='dict'):
+    """
+    Solve many sudoku grids, propagating all of them as one array first.
+    Args:
+        grids(list): grid strings in the format accepted by utils.grid_values().
+        engine(string): the engine solution.search() uses for puzzles propagation could not finish.
+    Returns:
+        A list with, for every grid, the solved sudoku in dictionary form, False if it has no solution,
+        or None if it could not be read (utils.grid_values() rejects it).
+    """
+    solution.get_engine(engine)
+    results = [None] * len(grids)
+    readable = []
+    for i, grid in enumerate(grids):
+        try:
+            readable.append((i, normalize(grid)))
+        except ValueError:
+            pass
+    if not readable:
+        return results
+    cands, status = propagate(to_array([grid for i, grid in readable]))
+    for (i, grid), row, state in zip(readable, cands.tolist(), status.tolist()):
+        if state == FAILED:
+            results[i] = False
+        elif state == SOLVED:
+            results[i] = bitmask.to_values(row)
+        else:
+            results[i] = solution.search(bitmask.to_values(row), engine)
+    return results
@@ -1,7 +1,12 @@
 from PySudoku import play
 
-def visualize_assignments(assignments):
-    """ Visualizes the set of assignments created by the Sudoku AI"""
+def visualize_assignments(assignments, headless=False, frame_dir=None, frame_format='png'):
+    """ Visualizes the set of assignments created by the Sudoku AI.
+    assignments is a list of boards in dictionary form, or a utils.Trace to rebuild them from.
+    headless, frame_dir and frame_format are passed on to PySudoku.play(), to render without a display
+    and save the frames."""
+    if hasattr(assignments, 'frames'):
+        assignments = list(assignments.frames())
     last_assignment = None
     filtered_assignments = []
 
@@ -14,4 +19,4 @@ def visualize_assignments(assignments):
                 filtered_assignments.append(assignments[i])
         last_assignment = assignments[i]
 
-    play(filtered_assignments)
+    return play(filtered_assignments, headless, frame_dir, frame_format=frame_format)